@@ -1,5 +1,7 @@
 import sys
 import os
+import logging
+import time
 
 # PyQt6のパスを設定（Anaconda環境での競合を回避）
 _pyqt6_path = os.path.join(
@@ -11,15 +13,23 @@ os.environ['QT_QPA_PLATFORM_PLUGIN_PATH'] = os.path.join(_pyqt6_path, 'plugins',
 os.environ['QT_PLUGIN_PATH'] = os.path.join(_pyqt6_path, 'plugins')
 os.environ['DYLD_FRAMEWORK_PATH'] = os.path.join(_pyqt6_path, 'lib')
 
-from PyQt6.QtWidgets import QApplication, QFileDialog, QMessageBox
+from PyQt6.QtWidgets import QApplication, QFileDialog, QInputDialog, QMessageBox
 from PyQt6.QtGui import QImage
+from PyQt6.QtCore import QTimer
 
 # ↑ QAction はここからインポート
 # 自身の作成したモジュールをインポート
-from model import MapData
+from model import MapData, PassabilityMap
+from model.edit_client import BackgroundEditClient
+from model.exporters import export_tmx, import_tmx
+from model.validation import MapValidationError
+from model.profiling import configure_logging, metrics
 from view import MainWindow
 from view.main_window import TilesetSplitDialog
 
+# ログの詳細度は環境変数 MAP_EDITOR_LOG_LEVEL (DEBUG/INFO/WARNING...) で切り替える
+logger = logging.getLogger("map_editor")
+
 
 # Controller的な役割を担うクラス
 class MapEditorController:
@@ -27,17 +37,38 @@ class MapEditorController:
         self.app = QApplication(sys.argv)
         # Modelのインスタンス化
         self.map_data = MapData(width=20, height=15, tile_size=32)
+        # 連結領域のキャッシュ (タイル変更に合わせて差分更新される)
+        self.passability = PassabilityMap(self.map_data)
         # Viewのインスタンス化
         self.main_window = MainWindow(self)
 
         # アクションとロジックの接続
         self.main_window.save_action.triggered.connect(self.save_map)
         self.main_window.load_action.triggered.connect(self.load_map)
+        self.main_window.export_tmx_action.triggered.connect(self.export_tmx)
+        self.main_window.import_tmx_action.triggered.connect(self.import_tmx)
+
+        # 矩形選択・コピー/貼り付け・スタンプ
+        self.clipboard = None
+        self.main_window.undo_action.triggered.connect(self.undo)
+        self.main_window.redo_action.triggered.connect(self.redo)
+        self.main_window.copy_action.triggered.connect(self.copy_selection)
+        self.main_window.cut_action.triggered.connect(self.cut_selection)
+        self.main_window.paste_action.triggered.connect(self.paste)
+        self.main_window.save_stamp_action.triggered.connect(self.save_stamp)
+        self.main_window.dump_metrics_action.triggered.connect(self.dump_metrics)
+
+        # 共同編集 (クライアントモード) 用
+        self.edit_client = None
+        self._pending_deltas = []
+        self._sync_timer = QTimer()
+        self._sync_timer.setInterval(30)
+        self._sync_timer.timeout.connect(self.sync_with_server)
 
     def set_current_tile(self, tile_id):
         """Modelの現在のタイルIDを設定"""
         if self.map_data.set_current_tile(tile_id):
-            print(f"Current tile set to ID: {tile_id}")
+            logger.debug("Current tile set to ID: %s", tile_id)
 
     def set_current_tileset(self, name):
         if self.map_data.set_current_tileset(name):
@@ -48,9 +79,134 @@ class MapEditorController:
     def place_tile(self, x, y):
         """指定されたグリッド座標に現在のタイルを配置 (Modelを操作)"""
         if self.map_data.set_tile_id(x, y, self.map_data.current_tile_id):
-            print(f"Placed tile ID {self.map_data.current_tile_id} at ({x}, {y})")
+            logger.debug("Placed tile ID %s at (%s, %s)", self.map_data.current_tile_id, x, y)
+            if self.edit_client is not None:
+                # ストロークはまとめて送信する (sync_with_server)
+                self._pending_deltas.append((x, y, self.map_data.current_tile_id))
+
+    def copy_selection(self):
+        """選択範囲をクリップボードにコピー"""
+        selection = self.main_window.map_widget.selection
+        if selection is None:
+            return False
+        self.clipboard = self.map_data.copy_region(*selection)
+        return True
+
+    def cut_selection(self):
+        """選択範囲をコピーし、現在のタイルセットの先頭タイルで塗りつぶす"""
+        if not self.copy_selection():
+            return
+        fill_tile_id = self.map_data.tile_sets[self.map_data.current_tileset][0]["id"]
+        self._share_rect(
+            self.map_data.fill_region(*self.main_window.map_widget.selection, fill_tile_id)
+        )
+
+    def paste(self):
+        """クリップボードの内容をスタンプとして持ち、クリックした位置に貼り付ける"""
+        if self.clipboard is not None:
+            self.main_window.map_widget.set_tool("stamp", self.clipboard)
+
+    def select_stamp(self, name):
+        stamp = self.map_data.stamps.get(name)
+        if stamp is not None:
+            self.main_window.map_widget.set_tool("stamp", stamp)
+
+    def save_stamp(self):
+        """選択範囲を名前付きスタンプとして登録"""
+        selection = self.main_window.map_widget.selection
+        if selection is None:
+            QMessageBox.warning(self.main_window, "Warning", "Select an area first.")
+            return
+        name, ok = QInputDialog.getText(self.main_window, "Save Stamp", "Stamp name:")
+        if ok and name:
+            self.map_data.add_stamp(name, self.map_data.copy_region(*selection))
+            self.main_window.populate_stamp_combo()
+
+    def apply_stamp(self, x, y):
+        """現在のスタンプを (x, y) を左上として1回の操作で貼り付ける"""
+        stamp = self.main_window.map_widget.stamp
+        if stamp is not None:
+            self._share_rect(self.map_data.blit_region(stamp, x, y))
+
+    def begin_stroke(self):
+        """ドラッグ1回分のペイントを1回の Undo 操作にまとめる"""
+        self.map_data.begin_stroke()
+
+    def end_stroke(self):
+        self.map_data.end_stroke()
+
+    def undo(self):
+        self._share_cells(self.map_data.undo())
+
+    def redo(self):
+        self._share_cells(self.map_data.redo())
+
+    def _share_rect(self, rect):
+        """クライアントモードでは矩形編集の結果も差分として送信する"""
+        if self.edit_client is None or rect is None:
+            return
+        x, y, w, h = rect
+        data = self.map_data.data
+        self._pending_deltas.extend(
+            (cx, cy, data[cy][cx]) for cy in range(y, y + h) for cx in range(x, x + w)
+        )
+
+    def _share_cells(self, cells):
+        """Undo/Redo で実際に戻したセルだけを送信する (他のユーザーの編集は送り返さない)"""
+        if self.edit_client is None or not cells:
+            return
+        data = self.map_data.data
+        self._pending_deltas.extend((x, y, data[y][x]) for x, y in cells)
+
+    def connect_to_server(self, host="127.0.0.1", port=8765, unix_path=None):
+        """共同編集サーバーに接続し、クライアントモードに切り替える"""
+        client = BackgroundEditClient(self.map_data)
+        client.connect(host, port, unix_path)
+        self.edit_client = client
+        self._pending_deltas = []
+        self.main_window.refresh_from_model()
+        self.main_window.set_shared_editing(True)
+        self._sync_timer.start()
+
+    def disconnect_from_server(self):
+        self._sync_timer.stop()
+        if self.edit_client is not None:
+            self.sync_with_server()
+            self.edit_client.close()
+            self.edit_client = None
+            self.main_window.set_shared_editing(False)
+
+    def sync_with_server(self):
+        """溜まったローカルの差分を送信し、受信済みのリモート差分を反映する"""
+        if self.edit_client is None:
+            return
+        if self._pending_deltas:
+            self.edit_client.send_deltas(self._pending_deltas)
+            self._pending_deltas = []
+        # 反映した範囲はMapDataの変更通知で部分的に再描画される
+        self.edit_client.apply_pending()
+
+    def find_path(self, start, goal):
+        """2マス間の経路を返す。到達できない場合は None"""
+        return self.passability.find_path(start, goal)
+
+    def _local_only(self):
+        """
+        サイズ変更・読み込み・タイル追加はサーバーに送る手段が無いため、共同編集中は拒否する
+        (ローカルだけ変えるとサーバーや他のエディタと内容がずれる)
+        """
+        if self.edit_client is None:
+            return False
+        QMessageBox.warning(
+            self.main_window,
+            "Warning",
+            "This operation is not available while connected to an edit server.",
+        )
+        return True
 
     def resize_map(self, width, height):
+        if self._local_only():
+            return
         self.map_data.resize(width, height)
         self.main_window.update_map_widget()
 
@@ -72,31 +228,112 @@ class MapEditorController:
 
     def load_map(self):
         """読み込み処理ロジック (Controller)"""
+        if self._local_only():
+            return
         file_path, _ = QFileDialog.getOpenFileName(
             self.main_window, "Load Map", "", "Map Files (*.json)"
         )
         if file_path:
             try:
-                # 読み込み処理 (Modelを操作)
-                self.map_data.load_map(file_path)
+                # 読み込み処理 (Modelを操作)。読み込み時に検証も行われる
+                try:
+                    self.map_data.load_map(file_path)
+                    loaded = True
+                except MapValidationError:
+                    loaded = False
+                report = self.map_data.last_validation_report
+
+                if report.needs_repair:
+                    answer = QMessageBox.question(
+                        self.main_window,
+                        "Invalid Map",
+                        f"{report.summary()}\n\nRepair the map with the fallback tile?",
+                    )
+                    if answer == QMessageBox.StandardButton.Yes:
+                        self.map_data.load_map(file_path, repair=True)
+                        loaded = True
+                if not loaded:
+                    return
 
                 # Viewの更新 (Modelの内容が変わったことをViewに伝える)
                 self.main_window.refresh_from_model()
 
+                report = self.map_data.last_validation_report
+                if report.ok or report.repaired and not report.missing_images:
+                    QMessageBox.information(
+                        self.main_window, "Success", "Map loaded successfully."
+                    )
+                else:
+                    QMessageBox.warning(
+                        self.main_window, "Warning", f"Map loaded with problems:\n{report.summary()}"
+                    )
+            except Exception as e:
+                QMessageBox.critical(
+                    self.main_window, "Error", f"Failed to load map: {e}"
+                )
+
+    def export_tmx(self):
+        """Tiled 互換の TMX として書き出す"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self.main_window, "Export TMX", "", "Tiled Maps (*.tmx)"
+        )
+        if file_path:
+            try:
+                export_tmx(self.map_data, file_path)
+                QMessageBox.information(
+                    self.main_window, "Success", "Map exported successfully."
+                )
+            except Exception as e:
+                QMessageBox.critical(
+                    self.main_window, "Error", f"Failed to export map: {e}"
+                )
+
+    def import_tmx(self):
+        """TMX を読み込んで現在のマップを置き換える"""
+        if self._local_only():
+            return
+        file_path, _ = QFileDialog.getOpenFileName(
+            self.main_window, "Import TMX", "", "Tiled Maps (*.tmx)"
+        )
+        if file_path:
+            try:
+                import_tmx(file_path, self.map_data)
+                self.main_window.refresh_from_model()
                 QMessageBox.information(
-                    self.main_window, "Success", "Map loaded successfully."
+                    self.main_window, "Success", "Map imported successfully."
                 )
             except Exception as e:
                 QMessageBox.critical(
-                    self.main_window, "Error", f"Failed to load map: {e}"
+                    self.main_window, "Error", f"Failed to import map: {e}"
+                )
+
+    def dump_metrics(self):
+        """計測結果を JSON で書き出す"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self.main_window, "Dump Metrics", "metrics.json", "JSON Files (*.json)"
+        )
+        if file_path:
+            try:
+                metrics.dump(file_path)
+            except Exception as e:
+                QMessageBox.critical(
+                    self.main_window, "Error", f"Failed to dump metrics: {e}"
                 )
 
     def run(self):
         self.main_window.show()
-        sys.exit(self.app.exec())
+        exit_code = self.app.exec()
+        self.disconnect_from_server()
+        # MAP_EDITOR_METRICS_DUMP が指定されていれば終了時に計測結果を書き出す
+        dump_path = os.environ.get("MAP_EDITOR_METRICS_DUMP")
+        if dump_path:
+            metrics.dump(dump_path)
+        sys.exit(exit_code)
 
     def load_external_tile(self):
         """外部画像を選んで、タイルとして追加する"""
+        if self._local_only():
+            return
         file_path, _ = QFileDialog.getOpenFileName(
             self.main_window,
             "Load Tile Image",
@@ -117,6 +354,8 @@ class MapEditorController:
 
     def load_external_tileset(self):
         """外部画像を読み込み、ユーザーが指定した分割数で分割して一括追加する"""
+        if self._local_only():
+            return
         file_path, _ = QFileDialog.getOpenFileName(
             self.main_window,
             "Load Tileset Image",
@@ -141,6 +380,7 @@ class MapEditorController:
                 return  # キャンセルされた場合
 
             h_div, v_div = dialog.get_values()
+            autotile_group = dialog.get_autotile_group()
             tile_width = width // h_div
             tile_height = height // v_div
 
@@ -154,7 +394,9 @@ class MapEditorController:
 
             # タイル分割処理
             new_tile_id = -1
+            new_ids = []
             count = 0
+            split_start = time.perf_counter()
 
             for row in range(v_div):
                 for col in range(h_div):
@@ -177,8 +419,19 @@ class MapEditorController:
                     )
                     if new_tile_id == -1:
                         new_tile_id = new_id
+                    new_ids.append(new_id)
                     count += 1
 
+            metrics.add_time("tileset_split", time.perf_counter() - split_start)
+            metrics.count("tileset_split.tiles", count)
+            logger.info("Split %s into %d tiles", file_path, count)
+
+            if autotile_group:
+                # 左上から順にマスク 0〜15 のバリアントとして登録し、置き済みのタイルも再計算する
+                self.map_data.set_autotile_rules(
+                    (tile_id, autotile_group, mask) for mask, tile_id in enumerate(new_ids[:16])
+                )
+
             if count > 0:
                 self.map_data.set_current_tileset(tileset_name)
                 if new_tile_id != -1:
@@ -196,5 +449,11 @@ class MapEditorController:
             QMessageBox.critical(self.main_window, "Error", f"Failed to load tileset: {e}")
 
 if __name__ == "__main__":
+    configure_logging()
     editor = MapEditorController()
+    # --connect host:port で共同編集サーバーに接続して起動
+    if "--connect" in sys.argv:
+        address = sys.argv[sys.argv.index("--connect") + 1]
+        host, _, port = address.rpartition(":")
+        editor.connect_to_server(host or "127.0.0.1", int(port))
     editor.run()
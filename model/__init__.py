@@ -1 +1,2 @@
 from .map_data import MapData
+from .passability import PassabilityMap
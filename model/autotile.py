@@ -0,0 +1,148 @@
+"""近傍マスクに基づくオートタイル処理"""
+
+# 4近傍のビット (同じグループのタイルが隣接していればビットが立つ)
+NORTH = 1
+EAST = 2
+SOUTH = 4
+WEST = 8
+ALL_NEIGHBORS = NORTH | EAST | SOUTH | WEST
+
+_OFFSETS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+
+
+class AutoTiler:
+    """
+    タイル定義の "autotile_group" / "autotile_mask" からルールを構築し、
+    周囲のタイルに合わせてバリアント (辺・角) を選び直す
+    """
+
+    def __init__(self, tile_lookup):
+        self.group_of = {}  # tile_id -> グループ名
+        self.rules = {}  # グループ名 -> {mask: tile_id}
+        self.defaults = {}  # グループ名 -> マスクに対応するルールが無いときのタイルID
+
+        for tile_id, tile in tile_lookup.items():
+            group = tile.get("autotile_group")
+            if group is None:
+                continue
+            self.group_of[tile_id] = group
+            rules = self.rules.setdefault(group, {})
+            mask = tile.get("autotile_mask")
+            if mask is None:
+                # マスク未指定のタイルをグループの既定タイルとして扱う
+                self.defaults[group] = tile_id
+            else:
+                rules.setdefault(mask & ALL_NEIGHBORS, tile_id)
+            self.defaults.setdefault(group, tile_id)
+
+        # 全体処理用: グループを 1 始まりの番号に置き換えた変換表
+        self._group_index = {}
+        self._variant_table = [None] * 16  # index 0 は「グループ無し」
+        for index, group in enumerate(self.rules, start=1):
+            self._group_index[group] = index
+            rules = self.rules[group]
+            default = self.defaults[group]
+            self._variant_table.extend(rules.get(mask, default) for mask in range(16))
+        self._index_of = {
+            tile_id: self._group_index[group]
+            for tile_id, group in self.group_of.items()
+        }
+
+    def has_rules(self):
+        return bool(self.rules)
+
+    def variant_for(self, group, mask):
+        """グループとマスクから配置すべきタイルIDを返す"""
+        return self.rules[group].get(mask, self.defaults[group])
+
+    def neighbor_mask(self, data, width, height, x, y):
+        group = self.group_of.get(data[y][x])
+        mask = 0
+        for bit, (dx, dy) in zip((NORTH, EAST, SOUTH, WEST), _OFFSETS):
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < width and 0 <= ny < height:
+                if self.group_of.get(data[ny][nx]) == group:
+                    mask |= bit
+        return mask
+
+    def apply(self, data, width, height, cells):
+        """
+        変更されたセルとその周囲1マスのみバリアントを再計算する
+        書き換えたセルの座標リストを返す
+        """
+        if not self.rules:
+            return []
+
+        affected = set()
+        for x, y in cells:
+            affected.add((x, y))
+            for dx, dy in _OFFSETS:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < width and 0 <= ny < height:
+                    affected.add((nx, ny))
+
+        # バリアントを変えてもグループは変わらないので、1パスで確定する
+        changed = []
+        for x, y in affected:
+            tile_id = data[y][x]
+            group = self.group_of.get(tile_id)
+            if group is None:
+                continue
+            new_id = self.variant_for(
+                group, self.neighbor_mask(data, width, height, x, y)
+            )
+            if new_id != tile_id:
+                data[y][x] = new_id
+                changed.append((x, y))
+        return changed
+
+    def apply_all(self, data, width, height):
+        """
+        マップ全体を行単位の近傍演算でまとめて再計算する
+        書き換えたセル数を返す
+        """
+        return self.apply_rect(data, width, height, 0, 0, width, height)
+
+    def apply_rect(self, data, width, height, x, y, w, h):
+        """
+        マップ内の矩形 (x, y, w, h) のセルを行単位の近傍演算でまとめて再計算する
+        矩形の外側のセルは近傍として参照するだけで書き換えない。書き換えたセル数を返す
+        """
+        if not self.rules or w <= 0 or h <= 0:
+            return 0
+
+        index_of = self._index_of
+        table = self._variant_table
+        # 左右1マスずつ余分に読み、マップ外はグループ無し (0) で埋める
+        pad_left = [0] if x == 0 else []
+        pad_right = [0] if x + w == width else []
+        start, end = max(0, x - 1), x + w + 1
+        empty = [0] * (w + 2)
+
+        def group_row(row_y):
+            if not 0 <= row_y < height:
+                return empty
+            groups = [index_of.get(tile_id, 0) for tile_id in data[row_y][start:end]]
+            return pad_left + groups + pad_right
+
+        changed = 0
+        above, current = group_row(y - 1), group_row(y)
+        for row_y in range(y, y + h):
+            below = group_row(row_y + 1)
+            row = current[1:-1]
+            if any(row):
+                old_row = data[row_y][x : x + w]
+                new_row = [
+                    table[g * 16 + ((u == g) | (r == g) << 1 | (d == g) << 2 | (l == g) << 3)]
+                    if g
+                    else tile_id
+                    for tile_id, g, u, r, d, l in zip(
+                        old_row, row, above[1:-1], current[2:], below[1:-1], current[:-2]
+                    )
+                ]
+                if new_row != old_row:
+                    changed += sum(1 for a, b in zip(old_row, new_row) if a != b)
+                    data[row_y][x : x + w] = new_row
+            # バリアントを変えてもグループは変わらないので、書き換え後の行を読み直す必要はない
+            above, current = current, below
+        return changed
@@ -0,0 +1,123 @@
+"""MapEditServer に接続して差分を送受信するクライアント"""
+import asyncio
+import queue
+import threading
+
+from .edit_server import encode_message, open_connection, read_message
+
+
+class MapEditClient:
+    """asyncio ベースのクライアント。受信した差分の適用は呼び出し側が行う"""
+
+    def __init__(self, map_data):
+        self.map_data = map_data
+        self._reader = None
+        self._writer = None
+
+    async def connect(self, host="127.0.0.1", port=None, unix_path=None):
+        """接続してスナップショットを受け取り、MapData に読み込む"""
+        self.map_data.load_dict(await self.subscribe(host, port, unix_path))
+
+    async def subscribe(self, host="127.0.0.1", port=None, unix_path=None):
+        """接続してスナップショット (MapData.to_dict() 形式) を返す。MapData には読み込まない"""
+        self._reader, self._writer = await open_connection(host, port, unix_path)
+        self._writer.write(encode_message({"type": "subscribe"}))
+        await self._writer.drain()
+        message = await read_message(self._reader)
+        if message is None or message.get("type") != "snapshot":
+            raise ConnectionError("Server did not send a snapshot.")
+        return message["map"]
+
+    async def send_deltas(self, cells):
+        """(x, y, tile_id) の並びを1メッセージにまとめて送る"""
+        cells = [[x, y, tile_id] for x, y, tile_id in cells]
+        if not cells:
+            return
+        self._writer.write(encode_message({"type": "deltas", "cells": cells}))
+        await self._writer.drain()
+
+    async def receive(self):
+        """次に配信された差分 ([[x, y, tile_id], ...]) を返す。切断時は None"""
+        while True:
+            message = await read_message(self._reader)
+            if message is None:
+                return None
+            if message.get("type") == "deltas":
+                return message["cells"]
+
+    def apply_deltas(self, cells):
+        """
+        受信した差分を MapData に反映する
+        サーバー側でオートタイル済みなので、ここでは再計算しない
+        """
+        return self.map_data.set_tiles(
+            ((x, y, tile_id) for x, y, tile_id in cells), autotile=False
+        )
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._writer = None
+
+
+class BackgroundEditClient:
+    """
+    GUIスレッドから使うためのラッパー
+    通信は別スレッドのイベントループで行い、受信差分は apply_pending() で呼び出し側のスレッドに反映する
+    """
+
+    def __init__(self, map_data):
+        self.client = MapEditClient(map_data)
+        self._incoming = queue.SimpleQueue()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self.connected = False
+
+    def connect(self, host="127.0.0.1", port=None, unix_path=None, timeout=5.0):
+        """
+        接続してスナップショットを読み込むまで待つ
+        変更通知で GUI のリスナーが呼ばれるため、読み込みは呼び出し側のスレッドで行う
+        """
+        self._thread.start()
+        future = asyncio.run_coroutine_threadsafe(
+            self.client.subscribe(host, port, unix_path), self._loop
+        )
+        self.client.map_data.load_dict(future.result(timeout))
+        self.connected = True
+        asyncio.run_coroutine_threadsafe(self._receive_loop(), self._loop)
+
+    async def _receive_loop(self):
+        while True:
+            cells = await self.client.receive()
+            if cells is None:
+                self.connected = False
+                return
+            self._incoming.put(cells)
+
+    def send_deltas(self, cells):
+        cells = list(cells)
+        if cells and self.connected:
+            asyncio.run_coroutine_threadsafe(self.client.send_deltas(cells), self._loop)
+
+    def apply_pending(self):
+        """受信済みの差分をすべて反映し、変更されたセルの座標リストを返す"""
+        changed = []
+        while True:
+            try:
+                cells = self._incoming.get_nowait()
+            except queue.Empty:
+                return changed
+            changed += self.client.apply_deltas(cells)
+
+    def close(self):
+        if self._thread.is_alive():
+            asyncio.run_coroutine_threadsafe(self.client.close(), self._loop).result(5.0)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5.0)
+        if not self._loop.is_running():
+            self._loop.close()
+        self.connected = False
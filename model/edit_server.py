@@ -0,0 +1,203 @@
+"""
+複数エディタで1枚のマップを同時編集するためのローカルサーバー
+
+プロトコルは1行1メッセージの JSON:
+    client -> server  {"type": "subscribe"}
+    server -> client  {"type": "snapshot", "map": MapData.to_dict()}
+    client -> server  {"type": "deltas", "cells": [[x, y, tile_id], ...]}
+    server -> client  {"type": "deltas", "seq": n, "cells": [[x, y, tile_id], ...]}
+
+サーバーは受け取った差分を自身の MapData に適用し、flush_interval ごとに
+セル単位でまとめた (同じセルは最後の値のみ) 差分を購読中の全クライアントへ送る
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+
+from .map_data import MapData
+from .profiling import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# スナップショットは1行で大きくなるため、読み込みバッファの上限を広げておく
+STREAM_LIMIT = 64 * 1024 * 1024
+
+
+def encode_message(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+async def read_message(reader):
+    """1メッセージ読み込む。接続が閉じられた場合は None"""
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+async def open_connection(host="127.0.0.1", port=None, unix_path=None):
+    if unix_path:
+        return await asyncio.open_unix_connection(unix_path, limit=STREAM_LIMIT)
+    return await asyncio.open_connection(host, port, limit=STREAM_LIMIT)
+
+
+class MapEditServer:
+    """MapData を所有し、クライアントからの差分をまとめて配信する asyncio サーバー"""
+
+    def __init__(self, map_data, flush_interval=0.02):
+        self.map_data = map_data
+        self.flush_interval = flush_interval
+        self.seq = 0
+        self._server = None
+        self._subscribers = set()
+        self._pending = {}  # (x, y) -> 配信待ちのタイルID
+        self._flush_handle = None
+
+    async def start(self, host="127.0.0.1", port=0, unix_path=None):
+        """待ち受けを開始する。port=0 の場合は空いているポートを使う"""
+        if unix_path:
+            self._server = await asyncio.start_unix_server(
+                self._handle_client, unix_path, limit=STREAM_LIMIT
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_client, host, port, limit=STREAM_LIMIT
+            )
+        return self.address
+
+    @property
+    def address(self):
+        """TCP の場合は (host, port)、Unix ソケットの場合はパス"""
+        return self._server.sockets[0].getsockname()
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._flush()
+        for writer in list(self._subscribers):
+            writer.close()
+        self._subscribers.clear()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    message = await read_message(reader)
+                except ValueError:
+                    # 壊れた行は読み捨てて接続は維持する
+                    logger.warning("Ignored a malformed message")
+                    continue
+                if message is None:
+                    break
+                if not isinstance(message, dict):
+                    logger.warning("Ignored a message that is not an object")
+                    continue
+                kind = message.get("type")
+                if kind == "subscribe":
+                    writer.write(
+                        encode_message({"type": "snapshot", "map": self.map_data.to_dict()})
+                    )
+                    # drain を待つ間に配信された差分も取りこぼさないよう、
+                    # スナップショットを書き込んだ直後 (同じ順序で送られる) に購読者へ加える
+                    self._subscribers.add(writer)
+                    await writer.drain()
+                elif kind == "deltas":
+                    self.apply_deltas(self.valid_cells(message.get("cells")))
+        except ConnectionError:
+            pass
+        finally:
+            self._subscribers.discard(writer)
+            writer.close()
+
+    def valid_cells(self, cells):
+        """
+        受信した差分のうち、マップ内の座標と定義済みのタイルIDを持つ [x, y, tile_id] だけを返す
+        不正なセルは捨てる (1つでも途中で失敗するとサーバーとクライアントの内容がずれるため、適用前に検査する)
+        """
+        if not isinstance(cells, list):
+            logger.warning("Ignored deltas without a cell list")
+            return []
+        map_data = self.map_data
+        valid = []
+        for cell in cells:
+            if (
+                isinstance(cell, list)
+                and len(cell) == 3
+                and all(type(value) is int for value in cell)
+                and 0 <= cell[0] < map_data.width
+                and 0 <= cell[1] < map_data.height
+                and cell[2] in map_data.tile_lookup
+            ):
+                valid.append(cell)
+        if len(valid) != len(cells):
+            logger.warning("Ignored %d invalid cells", len(cells) - len(valid))
+        return valid
+
+    def apply_deltas(self, cells):
+        """差分を MapData に適用し、オートタイル結果を含む変更セルを配信待ちに積む"""
+        changed = self.map_data.set_tiles((x, y, tile_id) for x, y, tile_id in cells)
+        data = self.map_data.data
+        for x, y in changed:
+            self._pending[(x, y)] = data[y][x]
+        if self._pending and self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.flush_interval, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        if not self._pending:
+            return
+        self.seq += 1
+        payload = encode_message({
+            "type": "deltas",
+            "seq": self.seq,
+            "cells": [[x, y, tile_id] for (x, y), tile_id in self._pending.items()],
+        })
+        self._pending = {}
+        for writer in list(self._subscribers):
+            if writer.is_closing():
+                self._subscribers.discard(writer)
+                continue
+            writer.write(payload)
+
+
+async def _run(args):
+    map_data = MapData()
+    if args.map and os.path.exists(args.map):
+        map_data.load_map(args.map)
+    server = MapEditServer(map_data)
+    address = await server.start(args.host, args.port, unix_path=args.unix)
+    logger.info("Serving map on %s", address)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+        if args.map:
+            map_data.save_map(args.map)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Map edit server")
+    parser.add_argument("map", nargs="?", help="マップファイル (終了時に上書き保存)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="TCP の代わりに使う Unix ソケットのパス")
+    args = parser.parse_args()
+    configure_logging("INFO")
+    try:
+        asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
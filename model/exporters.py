@@ -0,0 +1,441 @@
+"""
+ゲームランタイム向けの書き出し/読み込み
+
+- Tiled 互換の TMX (レイヤーデータは base64 + zlib または CSV)
+- タイルIDを1行1マップ行で並べた CSV
+- ヘッダー付きの詰め込み配列 (リトルエンディアン、zlib 圧縮可)
+
+いずれもマップを行単位で圧縮器に流し込み、書き出し結果全体をメモリに持たない
+"""
+import base64
+import struct
+import zlib
+from xml.parsers import expat
+from xml.sax.saxutils import escape, quoteattr
+
+from .map_data import MapData
+
+# Tiled の GID の上位3ビットは反転フラグ
+GID_MASK = 0x1FFFFFFF
+
+PACKED_MAGIC = b"MAP1"
+_PACKED_HEADER = struct.Struct("<4sIIBB")
+_PACKED_FORMATS = {1: "B", 2: "H", 4: "I"}
+
+# TMX のタイルプロパティとして書き出さないキー
+_RESERVED_TILE_KEYS = ("id", "image")
+
+
+def assign_gids(tile_sets):
+    """
+    タイルセットを順に firstgid 付きで並べる
+    (名前, firstgid, タイル一覧) のリストと tile_id -> gid の辞書を返す
+    """
+    layout = []
+    gid_of = {}
+    firstgid = 1
+    for name, tiles in tile_sets.items():
+        layout.append((name, firstgid, tiles))
+        for index, tile in enumerate(tiles):
+            gid_of[tile["id"]] = firstgid + index
+        firstgid += len(tiles)
+    return layout, gid_of
+
+
+def _iter_row_chunks(map_data, chunk_rows):
+    for start in range(0, map_data.height, chunk_rows):
+        yield map_data.data[start : start + chunk_rows]
+
+
+class _Base64Writer:
+    """3バイト単位に揃えながら base64 を書き出す"""
+
+    def __init__(self, f):
+        self.f = f
+        self._rest = b""
+
+    def write(self, chunk):
+        chunk = self._rest + chunk
+        usable = len(chunk) - len(chunk) % 3
+        self._rest = chunk[usable:]
+        if usable:
+            self.f.write(base64.b64encode(chunk[:usable]).decode("ascii"))
+            self.f.write("\n")
+
+    def close(self):
+        if self._rest:
+            self.f.write(base64.b64encode(self._rest).decode("ascii"))
+            self.f.write("\n")
+            self._rest = b""
+
+
+def _property_xml(name, value):
+    if isinstance(value, bool):
+        kind, text = "bool", "true" if value else "false"
+    elif isinstance(value, int):
+        kind, text = "int", str(value)
+    elif isinstance(value, float):
+        kind, text = "float", repr(value)
+    else:
+        kind, text = None, str(value)
+    type_attr = f" type={quoteattr(kind)}" if kind else ""
+    return f"<property name={quoteattr(name)}{type_attr} value={quoteattr(text)}/>"
+
+
+def export_tmx(map_data, file_path, encoding="base64-zlib", chunk_rows=64):
+    """
+    TMX 形式で書き出す
+    encoding は "base64-zlib" または "csv"。元のタイルIDは各タイルの map_id プロパティに残す
+    """
+    if encoding not in ("base64-zlib", "csv"):
+        raise ValueError(f"Unsupported TMX encoding: {encoding}")
+
+    layout, gid_of = assign_gids(map_data.tile_sets)
+    ts = map_data.tile_size
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write(
+            f'<map version="1.10" orientation="orthogonal" renderorder="right-down" '
+            f'width="{map_data.width}" height="{map_data.height}" '
+            f'tilewidth="{ts}" tileheight="{ts}" infinite="0" '
+            f'nextlayerid="2" nextobjectid="1">\n'
+        )
+        for name, firstgid, tiles in layout:
+            f.write(
+                f" <tileset firstgid=\"{firstgid}\" name={quoteattr(name)} "
+                f"tilewidth=\"{ts}\" tileheight=\"{ts}\" tilecount=\"{len(tiles)}\" columns=\"0\">\n"
+            )
+            f.write('  <grid orientation="orthogonal" width="1" height="1"/>\n')
+            for index, tile in enumerate(tiles):
+                f.write(f'  <tile id="{index}">\n   <properties>\n')
+                f.write(f"    {_property_xml('map_id', tile['id'])}\n")
+                for key, value in tile.items():
+                    if key not in _RESERVED_TILE_KEYS:
+                        f.write(f"    {_property_xml(key, value)}\n")
+                f.write("   </properties>\n")
+                if tile.get("image"):
+                    f.write(
+                        f'   <image width="{ts}" height="{ts}" source={quoteattr(tile["image"])}/>\n'
+                    )
+                f.write("  </tile>\n")
+            f.write(" </tileset>\n")
+
+        f.write(
+            f' <layer id="1" name="{escape("Tile Layer 1")}" '
+            f'width="{map_data.width}" height="{map_data.height}">\n'
+        )
+        if encoding == "csv":
+            f.write('  <data encoding="csv">\n')
+            last_row = map_data.height - 1
+            for y, row in enumerate(map_data.data):
+                f.write(",".join(str(gid_of.get(tile_id, 0)) for tile_id in row))
+                f.write(",\n" if y < last_row else "\n")
+        else:
+            f.write('  <data encoding="base64" compression="zlib">\n')
+            row_format = struct.Struct(f"<{map_data.width}I")
+            compressor = zlib.compressobj()
+            writer = _Base64Writer(f)
+            for rows in _iter_row_chunks(map_data, chunk_rows):
+                packed = b"".join(
+                    row_format.pack(*[gid_of.get(tile_id, 0) for tile_id in row])
+                    for row in rows
+                )
+                writer.write(compressor.compress(packed))
+            writer.write(compressor.flush())
+            writer.close()
+        f.write("  </data>\n </layer>\n</map>\n")
+
+
+def export_csv(map_data, file_path):
+    """タイルIDをマップの1行につき1行の CSV で書き出す"""
+    with open(file_path, "w", encoding="utf-8") as f:
+        for row in map_data.data:
+            f.write(",".join(map(str, row)))
+            f.write("\n")
+
+
+def export_packed(map_data, file_path, item_size=2, compress=True, chunk_rows=64):
+    """
+    ヘッダー (magic, width, height, item_size, 圧縮フラグ) に続けて
+    タイルIDを行優先・リトルエンディアンの固定長整数で書き出す
+    """
+    if item_size not in _PACKED_FORMATS:
+        raise ValueError(f"Unsupported item size: {item_size}")
+    limit = 1 << (item_size * 8)
+    row_format = struct.Struct(f"<{map_data.width}{_PACKED_FORMATS[item_size]}")
+    with open(file_path, "wb") as f:
+        f.write(
+            _PACKED_HEADER.pack(
+                PACKED_MAGIC, map_data.width, map_data.height, item_size, int(compress)
+            )
+        )
+        compressor = zlib.compressobj() if compress else None
+        for rows in _iter_row_chunks(map_data, chunk_rows):
+            try:
+                packed = b"".join(row_format.pack(*row) for row in rows)
+            except struct.error:
+                raise ValueError(f"Tile IDs must fit in {item_size} bytes (< {limit}).")
+            f.write(compressor.compress(packed) if compressor else packed)
+        if compressor:
+            f.write(compressor.flush())
+
+
+def import_packed(file_path, map_data=None, read_size=65536):
+    """export_packed の出力を読み込む。タイル定義は map_data (または既定) のものを使う"""
+    if map_data is None:
+        map_data = MapData(width=0, height=0)
+    with open(file_path, "rb") as f:
+        magic, width, height, item_size, compressed = _PACKED_HEADER.unpack(
+            f.read(_PACKED_HEADER.size)
+        )
+        if magic != PACKED_MAGIC or item_size not in _PACKED_FORMATS:
+            raise ValueError("Not a packed map file.")
+        rows = _RowAssembler(f"<{width}{_PACKED_FORMATS[item_size]}")
+        decompressor = zlib.decompressobj() if compressed else None
+        while True:
+            chunk = f.read(read_size)
+            if not chunk:
+                break
+            rows.feed(decompressor.decompress(chunk) if decompressor else chunk)
+        if decompressor:
+            rows.feed(decompressor.flush())
+    _replace_map(
+        map_data, width, height, map_data.tile_size, map_data.tile_sets, rows.finish(height)
+    )
+    return map_data
+
+
+class _RowAssembler:
+    """バイト列を受け取り、1行分揃うごとにタイルIDの行へ変換する"""
+
+    def __init__(self, row_format, id_of_gid=None):
+        self.row_format = struct.Struct(row_format)
+        self.id_of_gid = id_of_gid
+        self.rows = []
+        self._buffer = bytearray()
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        size = self.row_format.size
+        if size == 0:
+            return
+        usable = len(self._buffer) - len(self._buffer) % size
+        for offset in range(0, usable, size):
+            values = self.row_format.unpack_from(self._buffer, offset)
+            if self.id_of_gid is not None:
+                values = [self.id_of_gid(gid) for gid in values]
+            self.rows.append(list(values))
+        del self._buffer[:usable]
+
+    def finish(self, height):
+        if len(self.rows) != height or self._buffer:
+            raise ValueError(
+                f"Layer data has {len(self.rows)} rows, expected {height}."
+            )
+        return self.rows
+
+
+def _replace_map(map_data, width, height, tile_size, tile_sets, rows):
+    """読み込んだ内容で MapData を置き換え、変更を通知する"""
+    map_data.width = width
+    map_data.height = height
+    map_data.tile_size = tile_size
+    map_data.tile_sets = tile_sets
+    map_data._rebuild_tile_lookup()
+    if map_data.current_tileset not in tile_sets:
+        map_data.current_tileset = next(iter(tile_sets))
+    if map_data.current_tile_id not in map_data.tile_lookup:
+        map_data.current_tile_id = tile_sets[map_data.current_tileset][0]["id"]
+    map_data.data = rows
+    map_data.clear_history()
+    map_data._notify_changed(None)
+
+
+def _parse_property(kind, text):
+    if kind == "bool":
+        return text == "true"
+    if kind == "int":
+        return int(text)
+    if kind == "float":
+        return float(text)
+    return text
+
+
+class _TmxReader:
+    """expat で TMX を逐次解析し、レイヤーデータを行ごとに復元する"""
+
+    def __init__(self):
+        self.width = self.height = self.tile_size = 0
+        self.tilesets = []  # (name, firstgid, tilecount, {local_id: tile})
+        self.rows = None
+        self._tileset = None
+        self._tile = None
+        self._in_layer = False
+        self._data_encoding = None
+        self._text = ""
+        self._decompressor = None
+        self._assembler = None
+        self._csv_row = []
+        self._id_of_gid = None
+
+    def parse(self, file_path, read_size=65536):
+        parser = expat.ParserCreate()
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        parser.CharacterDataHandler = self._characters
+        with open(file_path, "rb") as f:
+            while True:
+                chunk = f.read(read_size)
+                parser.Parse(chunk, not chunk)
+                if not chunk:
+                    break
+
+    def _start(self, name, attrs):
+        if name == "map":
+            self.width = int(attrs["width"])
+            self.height = int(attrs["height"])
+            self.tile_size = int(attrs["tilewidth"])
+        elif name == "tileset":
+            if "source" in attrs:
+                raise ValueError("External tilesets (.tsx) are not supported.")
+            tilecount = int(attrs["tilecount"]) if "tilecount" in attrs else None
+            self._tileset = (attrs.get("name", "Tileset"), int(attrs["firstgid"]), tilecount, {})
+            self.tilesets.append(self._tileset)
+        elif name == "tile" and self._tileset is not None:
+            self._tile = {}
+            self._tileset[3][int(attrs["id"])] = self._tile
+        elif name == "property" and self._tile is not None:
+            self._tile[attrs["name"]] = _parse_property(attrs.get("type"), attrs.get("value", ""))
+        elif name == "image" and self._tile is not None:
+            self._tile["image"] = attrs["source"]
+        elif name == "layer" and self.rows is None:
+            self._in_layer = True
+        elif name == "data" and self._in_layer:
+            self._begin_data(attrs.get("encoding"), attrs.get("compression"))
+
+    def _end(self, name):
+        if name == "tileset":
+            self._tileset = None
+        elif name == "tile":
+            self._tile = None
+        elif name == "data" and self._data_encoding:
+            self._end_data()
+        elif name == "layer":
+            self._in_layer = False
+
+    def _characters(self, text):
+        if self._data_encoding == "base64":
+            self._feed_base64(text)
+        elif self._data_encoding == "csv":
+            self._feed_csv(text)
+
+    def build_tile_sets(self):
+        """
+        TMX のタイルセットから tile_sets と gid -> tile_id の変換関数を作る
+        1枚画像のタイルセット (<tile> 要素を持たないタイル) も tilecount 分のタイルを作る。
+        画像の切り出しには対応していないため、それらのタイルは色のみで表示される
+        """
+        tile_sets = {}
+        id_of = {}
+        used_ids = {
+            tile["map_id"]
+            for _, _, _, tiles in self.tilesets
+            for tile in tiles.values()
+            if "map_id" in tile
+        }
+        next_id = max(used_ids, default=-1) + 1
+        for name, firstgid, tilecount, tiles in self.tilesets:
+            if tilecount is None:
+                if not tiles:
+                    raise ValueError(f"Tileset {name!r} has neither tilecount nor tiles.")
+                tilecount = max(tiles) + 1
+            entries = tile_sets.setdefault(name, [])
+            for local_id in sorted(set(range(tilecount)).union(tiles)):
+                tile = dict(tiles.get(local_id, {}))
+                tile_id = tile.pop("map_id", None)
+                if tile_id is None:
+                    tile_id, next_id = next_id, next_id + 1
+                tile = {"id": tile_id, **tile}
+                tile.setdefault("name", f"{name} {local_id}")
+                tile.setdefault("color", "#000000")
+                entries.append(tile)
+                id_of[firstgid + local_id] = tile_id
+        tile_sets = {name: entries for name, entries in tile_sets.items() if entries}
+        if not tile_sets:
+            raise ValueError("TMX file has no tiles.")
+        fallback = next(iter(tile_sets.values()))[0]["id"]
+
+        def id_of_gid(gid):
+            gid &= GID_MASK
+            if gid == 0:
+                # 空のマスはフォールバックタイルで埋める
+                return fallback
+            try:
+                return id_of[gid]
+            except KeyError:
+                raise ValueError(f"Tile gid {gid} is not defined by any tileset.") from None
+
+        self._id_of_gid = id_of_gid
+        return tile_sets
+
+    def _begin_data(self, encoding, compression):
+        if encoding == "base64":
+            if compression == "zlib":
+                self._decompressor = zlib.decompressobj()
+            elif compression == "gzip":
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            elif compression is not None:
+                raise ValueError(f"Unsupported TMX compression: {compression}")
+        elif encoding != "csv":
+            raise ValueError(f"Unsupported TMX encoding: {encoding}")
+        self.tile_sets = self.build_tile_sets()
+        self._data_encoding = encoding
+        self._assembler = _RowAssembler(f"<{self.width}I", self._id_of_gid)
+
+    def _feed_base64(self, text):
+        self._text += "".join(text.split())
+        usable = len(self._text) - len(self._text) % 4
+        if not usable:
+            return
+        raw = base64.b64decode(self._text[:usable])
+        self._text = self._text[usable:]
+        self._assembler.feed(self._decompressor.decompress(raw) if self._decompressor else raw)
+
+    def _feed_csv(self, text):
+        self._text += text
+        # 末尾の数値は途中で切れている可能性があるので次回に回す
+        *values, self._text = self._text.split(",")
+        for value in values:
+            value = value.strip()
+            if not value:
+                continue
+            self._csv_row.append(self._id_of_gid(int(value)))
+            if len(self._csv_row) == self.width:
+                self._assembler.rows.append(self._csv_row)
+                self._csv_row = []
+
+    def _end_data(self):
+        if self._data_encoding == "csv":
+            self._feed_csv(",")
+        elif self._decompressor is not None:
+            self._assembler.feed(self._decompressor.flush())
+        self.rows = self._assembler.finish(self.height)
+        self._data_encoding = None
+        self._in_layer = False
+
+
+def import_tmx(file_path, map_data=None):
+    """
+    TMX を逐次読み込み、MapData に反映して返す (map_data 省略時は新規作成)
+    タイルの map_id プロパティがあれば元のタイルIDを復元する
+    """
+    reader = _TmxReader()
+    reader.parse(file_path)
+    if reader.rows is None:
+        raise ValueError("TMX file has no tile layer.")
+    if map_data is None:
+        map_data = MapData(width=0, height=0)
+    _replace_map(
+        map_data, reader.width, reader.height, reader.tile_size, reader.tile_sets, reader.rows
+    )
+    return map_data
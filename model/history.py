@@ -0,0 +1,89 @@
+from array import array
+
+
+class RegionEdit:
+    """矩形編集 (貼り付け/スタンプ/切り取り) 1回分。変更範囲の変更前/変更後の TileRegion を持つ"""
+
+    __slots__ = ("x", "y", "before", "after")
+
+    def __init__(self, x, y, before, after):
+        self.x = x
+        self.y = y
+        self.before = before
+        self.after = after
+
+    def cells(self):
+        """変更されたセルの (x, y, 変更前, 変更後) を返す"""
+        width = self.before.width
+        for i, (old, new) in enumerate(zip(self.before.data, self.after.data)):
+            if old != new:
+                yield self.x + i % width, self.y + i // width, old, new
+
+
+class CellEdit:
+    """
+    ペイント1ストローク分の編集
+    斜めのドラッグでも外接矩形ではなく、書き換えたセルだけを配列で持つ
+    """
+
+    __slots__ = ("xs", "ys", "before", "after")
+
+    def __init__(self, changes):
+        self.xs = array("i")
+        self.ys = array("i")
+        self.before = array("i")
+        self.after = array("i")
+        for x, y, old, new in changes:
+            self.xs.append(x)
+            self.ys.append(y)
+            self.before.append(old)
+            self.after.append(new)
+
+    def __len__(self):
+        return len(self.xs)
+
+    def cells(self):
+        return zip(self.xs, self.ys, self.before, self.after)
+
+
+class EditHistory:
+    """
+    編集履歴 (Undo/Redo)
+    1回の操作につき RegionEdit または CellEdit を1つ記録する
+    """
+
+    def __init__(self, limit=50):
+        self.limit = limit
+        self._undo = []
+        self._redo = []
+
+    def record(self, edit):
+        self._undo.append(edit)
+        if len(self._undo) > self.limit:
+            del self._undo[0]
+        self._redo.clear()
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def pop_undo(self):
+        """取り消す操作を返す。無ければ None"""
+        if not self._undo:
+            return None
+        entry = self._undo.pop()
+        self._redo.append(entry)
+        return entry
+
+    def pop_redo(self):
+        if not self._redo:
+            return None
+        entry = self._redo.pop()
+        self._undo.append(entry)
+        return entry
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
@@ -1,5 +1,11 @@
 import json
+from array import array
+from .autotile import AutoTiler
+from .history import CellEdit, EditHistory, RegionEdit
+from .profiling import metrics
+from .region import TileRegion
 from .tileset import get_default_tile_sets
+from .validation import MapValidationError, repair_map_data, validate_map_data
 
 
 class MapData:
@@ -9,6 +15,15 @@ class MapData:
         self.width = width
         self.height = height
         self.tile_size = tile_size
+        # 変更通知を受け取るコールバック (View などが登録する)
+        self._change_listeners = []
+        # 直近の load_map / load_dict の検証結果
+        self.last_validation_report = None
+        # 矩形編集 (貼り付け/スタンプ/切り取り) とペイント1ストローク分の Undo 履歴と、名前付きスタンプ
+        self.history = EditHistory()
+        self.stamps = {}
+        # ストローク中に書き換えたセルの変更前のタイルID ((x, y) -> tile_id)。ストローク外は None
+        self._stroke = None
 
         # タイルセット定義
         self.tile_sets = tile_sets or get_default_tile_sets()
@@ -29,10 +44,224 @@ class MapData:
     def set_tile_id(self, x, y, tile_id):
         """指定座標のタイルIDを設定"""
         if 0 <= x < self.width and 0 <= y < self.height:
+            if self._stroke is not None:
+                # オートタイルで書き換わりうる周囲1マスも含めて変更前の値を覚えておく
+                for cy in range(max(0, y - 1), min(self.height, y + 2)):
+                    for cx in range(max(0, x - 1), min(self.width, x + 2)):
+                        self._stroke.setdefault((cx, cy), self.data[cy][cx])
             self.data[y][x] = tile_id
+            changed = [(x, y)]
+            changed += self.autotiler.apply(self.data, self.width, self.height, changed)
+            self._notify_changed(changed)
             return True
         return False
 
+    def set_tiles(self, changes, autotile=True):
+        """
+        (x, y, tile_id) の並びをまとめて設定する
+        オートタイルで書き換わったセルを含め、変更したセルの座標リストを返す
+        """
+        changed = []
+        for x, y, tile_id in changes:
+            if 0 <= x < self.width and 0 <= y < self.height:
+                self.data[y][x] = tile_id
+                changed.append((x, y))
+        if autotile and changed:
+            changed += self.autotiler.apply(self.data, self.width, self.height, changed)
+        self._notify_changed(changed)
+        return changed
+
+    def autotile_all(self):
+        """マップ全体のオートタイルを再計算し、書き換えたセル数を返す"""
+        count = self.autotiler.apply_all(self.data, self.width, self.height)
+        if count:
+            self._notify_changed(None)
+        return count
+
+    def set_autotile_rule(self, tile_id, group, mask=None):
+        """
+        タイルをオートタイルグループに登録する
+        mask は隣接方向のビット和 (北=1, 東=2, 南=4, 西=8)。None ならグループの既定タイル
+        """
+        return self.set_autotile_rules([(tile_id, group, mask)]) == 1
+
+    def set_autotile_rules(self, rules):
+        """
+        (tile_id, group, mask) の並びをまとめて登録し、マップ全体のオートタイルを1回だけ再計算する
+        group=None ならグループから外す。登録できたタイル数を返す
+        """
+        count = 0
+        for tile_id, group, mask in rules:
+            tile = self.tile_lookup.get(tile_id)
+            if tile is None:
+                continue
+            if group is None:
+                tile.pop("autotile_group", None)
+                tile.pop("autotile_mask", None)
+            else:
+                tile["autotile_group"] = group
+                if mask is None:
+                    tile.pop("autotile_mask", None)
+                else:
+                    tile["autotile_mask"] = mask
+            count += 1
+        if count:
+            self.autotiler = AutoTiler(self.tile_lookup)
+            # 既に置かれているタイルも新しいルールに合わせる (変更があれば全体を通知)
+            self.autotile_all()
+        return count
+
+    def copy_region(self, x, y, w, h):
+        """矩形範囲を TileRegion にコピーする。マップ外にはみ出した部分は切り詰める"""
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self.width, x + w), min(self.height, y + h)
+        if x1 <= x0 or y1 <= y0:
+            return TileRegion(0, 0)
+        data = array("i")
+        for row in self.data[y0:y1]:
+            data.extend(row[x0:x1])
+        return TileRegion(x1 - x0, y1 - y0, data)
+
+    def blit_region(self, region, x, y, record=True, autotile=True):
+        """
+        TileRegion を (x, y) を左上として行単位でまとめて書き込む (マップ端で切り詰め)
+        record=True なら1回の操作として Undo 履歴に残す
+        変更範囲 (x, y, w, h) を返す。書き込む範囲が無ければ None
+        """
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self.width, x + region.width), min(self.height, y + region.height)
+        if x1 <= x0 or y1 <= y0:
+            return None
+
+        # オートタイルで書き換わりうる周囲1マスも変更範囲に含める
+        autotile = autotile and self.autotiler.has_rules()
+        if autotile:
+            rx0, ry0 = max(0, x0 - 1), max(0, y0 - 1)
+            rx1, ry1 = min(self.width, x1 + 1), min(self.height, y1 + 1)
+        else:
+            rx0, ry0, rx1, ry1 = x0, y0, x1, y1
+        rect = (rx0, ry0, rx1 - rx0, ry1 - ry0)
+        before = self.copy_region(*rect) if record else None
+
+        sx0, sx1 = x0 - x, x1 - x
+        for dy in range(y0, y1):
+            self.data[dy][x0:x1] = region.row(dy - y, sx0, sx1)
+
+        if autotile:
+            # 塗りつぶしや手作りのスタンプは内側もオートタイル済みとは限らないので、
+            # 貼り付けた範囲と周囲1マスをまとめて再計算する
+            self.autotiler.apply_rect(self.data, self.width, self.height, *rect)
+
+        if record:
+            self.history.record(RegionEdit(rx0, ry0, before, self.copy_region(*rect)))
+        self._notify_rect(rect)
+        return rect
+
+    def fill_region(self, x, y, w, h, tile_id, record=True):
+        """矩形範囲を1種類のタイルで塗りつぶす (切り取りなどに使う)"""
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self.width, x + w), min(self.height, y + h)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return self.blit_region(
+            TileRegion.filled(x1 - x0, y1 - y0, tile_id), x0, y0, record=record
+        )
+
+    def begin_stroke(self):
+        """以降の set_tile_id を end_stroke() までまとめて1回の Undo 操作として記録する"""
+        self._stroke = {}
+
+    def end_stroke(self):
+        stroke, self._stroke = self._stroke, None
+        if not stroke:
+            return
+        data = self.data
+        edit = CellEdit(
+            (x, y, old, data[y][x]) for (x, y), old in stroke.items() if data[y][x] != old
+        )
+        if len(edit):
+            self.history.record(edit)
+
+    def clear_history(self):
+        """Undo 履歴を消す (サイズ変更や読み込みで座標が変わるとき)"""
+        self.history.clear()
+        if self._stroke is not None:
+            self._stroke = {}
+
+    def undo(self):
+        """
+        直前の編集を取り消し、戻したセルの座標リストを返す (履歴が無ければ None)
+        記録後に書き換えられたセル (後のストロークや他のユーザーの編集) はそのまま残す
+        """
+        edit = self.history.pop_undo()
+        if edit is None:
+            return None
+        return self._restore_cells((x, y, new, old) for x, y, old, new in edit.cells())
+
+    def redo(self):
+        edit = self.history.pop_redo()
+        if edit is None:
+            return None
+        return self._restore_cells(edit.cells())
+
+    def _restore_cells(self, cells):
+        """
+        (x, y, expected, target) のうち、現在も expected のままのセルだけを target の値に戻す
+        オートタイルのバリアントは隣の編集でも変わるので、同じグループなら書き換えていないとみなす。
+        戻した後は周囲1マスを含めてバリアントを選び直す
+        """
+        group_of = self.autotiler.group_of
+        data = self.data
+        changed = []
+        for x, y, expected, target in cells:
+            if x >= self.width or y >= self.height:
+                continue
+            current = data[y][x]
+            if current == expected or group_of.get(current, current) == group_of.get(expected, expected):
+                data[y][x] = target
+                changed.append((x, y))
+        if changed:
+            changed += self.autotiler.apply(self.data, self.width, self.height, changed)
+        self._notify_changed(changed)
+        return changed
+
+    def add_stamp(self, name, region):
+        """TileRegion を名前付きのスタンプとして登録する (マップと一緒に保存される)"""
+        if region.width == 0 or region.height == 0:
+            return False
+        self.stamps[name] = region
+        return True
+
+    def add_change_listener(self, callback):
+        """
+        タイル変更の通知先を登録する
+        callback(rect) の rect は変更範囲 (x, y, w, h)。マップ全体が変わった場合は None
+        """
+        self._change_listeners.append(callback)
+
+    def remove_change_listener(self, callback):
+        if callback in self._change_listeners:
+            self._change_listeners.remove(callback)
+
+    def _notify_changed(self, cells):
+        """変更セルを外接矩形にまとめて通知する (None はマップ全体)"""
+        if not self._change_listeners:
+            return
+        if cells is None:
+            rect = None
+        elif not cells:
+            return
+        else:
+            xs = [x for x, _ in cells]
+            ys = [y for _, y in cells]
+            x0, y0 = min(xs), min(ys)
+            rect = (x0, y0, max(xs) - x0 + 1, max(ys) - y0 + 1)
+        self._notify_rect(rect)
+
+    def _notify_rect(self, rect):
+        for callback in list(self._change_listeners):
+            callback(rect)
+
     def resize(self, width, height):
         """
         マップサイズを変更。既存データを保ちながら拡張/縮小する
@@ -47,6 +276,8 @@ class MapData:
         self.width = width
         self.height = height
         self.data = new_data
+        self.clear_history()
+        self._notify_changed(None)
 
     def get_tileset_names(self):
         return list(self.tile_sets.keys())
@@ -75,7 +306,12 @@ class MapData:
 
     def save_map(self, file_path):
         """マップデータをJSONファイルに保存"""
-        map_info = {
+        with metrics.timer("save_map"), open(file_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    def to_dict(self):
+        """保存形式 (JSON) の辞書に変換"""
+        return {
             "width": self.width,
             "height": self.height,
             "tile_size": self.tile_size,
@@ -84,24 +320,54 @@ class MapData:
             "current_tile_id": self.current_tile_id,
             # 二次元リストを一次元に平坦化して保存
             "data": [tile for row in self.data for tile in row],
+            "stamps": {name: region.to_dict() for name, region in self.stamps.items()},
         }
-        with open(file_path, "w") as f:
-            json.dump(map_info, f, indent=4)
 
-    def load_map(self, file_path):
+    def load_map(self, file_path, repair=False, fallback_tile_id=None, check_images=True):
         """マップデータをJSONファイルから読み込み、自身のプロパティを更新"""
-        with open(file_path, "r") as f:
-            map_info = json.load(f)
-
-        self.width = map_info["width"]
-        self.height = map_info["height"]
-        self.tile_size = map_info["tile_size"]
+        with metrics.timer("load_map"):
+            with open(file_path, "r") as f:
+                map_info = json.load(f)
+            return self.load_dict(map_info, repair, fallback_tile_id, check_images)
 
+    def load_dict(self, map_info, repair=False, fallback_tile_id=None, check_images=True):
+        """
+        to_dict() 形式の辞書から自身のプロパティを更新
+        読み込む前にデータ長・タイルID・画像パスを検証し、結果を last_validation_report に残す
+        repair=True なら未定義IDをフォールバックタイルに置き換え、データ長を揃えて読み込む
+        修復せずに読み込めない場合 (データ長の不一致) は MapValidationError を送出する
+        例外で失敗した場合 (スタンプの破損なども含む) は自身を変更しない
+        """
+        width = map_info["width"]
+        height = map_info["height"]
         if "tile_sets" in map_info:
-            self.tile_sets = map_info["tile_sets"]
+            tile_sets = map_info["tile_sets"]
         else:
             # 互換性確保: 旧データの場合はデフォルト設定
-            self.tile_sets = get_default_tile_sets()
+            tile_sets = get_default_tile_sets()
+        tile_lookup = {tile["id"]: tile for tiles in tile_sets.values() for tile in tiles}
+
+        flat_data = map_info["data"]
+        report = validate_map_data(width, height, flat_data, tile_lookup, check_images)
+        self.last_validation_report = report
+        if report.needs_repair:
+            if repair:
+                if fallback_tile_id not in tile_lookup:
+                    fallback_tile_id = next(iter(tile_sets.values()))[0]["id"]
+                flat_data = repair_map_data(flat_data, report, tile_lookup, fallback_tile_id)
+            elif report.length_mismatch:
+                raise MapValidationError(report)
+        # 失敗しうる解析は自身を書き換える前にすべて済ませておく
+        tile_size = map_info["tile_size"]
+        stamps = {
+            name: TileRegion.from_dict(info)
+            for name, info in map_info.get("stamps", {}).items()
+        }
+
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.tile_sets = tile_sets
         self._rebuild_tile_lookup()
 
         self.current_tileset = map_info.get(
@@ -117,11 +383,13 @@ class MapData:
             self.current_tile_id = self.tile_sets[self.current_tileset][0]["id"]
 
         # 読み込んだ一次元データを二次元リストに戻す
-        flat_data = map_info["data"]
         new_data = []
         for i in range(self.height):
             new_data.append(flat_data[i * self.width : (i + 1) * self.width])
         self.data = new_data
+        self.stamps = stamps
+        self.clear_history()
+        self._notify_changed(None)
 
         # 成功時に True を返す (Controllerで利用)
         return True
@@ -131,6 +399,7 @@ class MapData:
         for tiles in self.tile_sets.values():
             for tile in tiles:
                 self.tile_lookup[tile["id"]] = tile
+        self.autotiler = AutoTiler(self.tile_lookup)
 
     def _next_tile_id(self) -> int:
         """既存のタイルIDと衝突しない新しいIDを返す"""
@@ -0,0 +1,326 @@
+"""通行可否・移動コストと連結領域のキャッシュ、経路探索"""
+import heapq
+from collections import deque
+
+_OFFSETS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+# 周囲8マスを時計回りに並べたもの (隣り合う要素同士は上下左右で隣接している)
+_RING = ((0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1))
+
+# これより広い範囲が一度に変わった場合は差分更新せず、次の問い合わせ時に再計算する
+INCREMENTAL_LIMIT = 256
+
+
+def is_tile_passable(tile_def):
+    """タイル定義の通行可否。定義の無いタイルは通行不可として扱う"""
+    if tile_def is None:
+        return False
+    return bool(tile_def.get("passable", True))
+
+
+def tile_cost(tile_def):
+    """タイル定義の移動コスト (そのマスに入るときのコスト)"""
+    if tile_def is None:
+        return 1
+    return tile_def.get("cost", 1)
+
+
+class PassabilityMap:
+    """
+    MapData の通行可能なマスを上下左右の連結でラベル付けし、
+    タイルの変更に合わせて差分更新する (ラベル0は通行不可)
+    """
+
+    def __init__(self, map_data):
+        self.map_data = map_data
+        self.labels = []
+        self._passable = []
+        self._sizes = {}  # ラベル -> 領域のマス数
+        self._next_label = 1
+        self._dirty = True
+        map_data.add_change_listener(self._on_map_changed)
+
+    def detach(self):
+        self.map_data.remove_change_listener(self._on_map_changed)
+
+    # --- 問い合わせ ---
+
+    def region_of(self, x, y):
+        """指定マスの領域ラベルを返す (範囲外・通行不可は0)"""
+        self._ensure_labels()
+        if 0 <= x < self.map_data.width and 0 <= y < self.map_data.height:
+            return self.labels[y][x]
+        return 0
+
+    def region_count(self):
+        self._ensure_labels()
+        return len(self._sizes)
+
+    def is_reachable(self, start, goal):
+        label = self.region_of(*start)
+        return label != 0 and label == self.region_of(*goal)
+
+    def find_path(self, start, goal):
+        """
+        A* で start から goal までの最小コスト経路を返す (両端を含むマスのリスト)
+        到達できない場合はキャッシュ済みのラベルで即座に None を返す
+        """
+        if not self.is_reachable(start, goal):
+            return None
+        if start == goal:
+            return [start]
+
+        map_data = self.map_data
+        width, height = map_data.width, map_data.height
+        lookup = map_data.tile_lookup
+        # ヒューリスティックを許容的に保つため、最小コストを1歩の下限にする
+        min_cost = min(
+            (tile_cost(t) for t in lookup.values() if is_tile_passable(t)), default=1
+        )
+        min_cost = max(min_cost, 0)
+        gx, gy = goal
+
+        def heuristic(x, y):
+            return (abs(x - gx) + abs(y - gy)) * min_cost
+
+        best = {start: 0}
+        came_from = {}
+        # f が同じならゴールに近い (h が小さい) マスを優先して探索範囲を抑える
+        h = heuristic(*start)
+        open_heap = [(h, h, 0, start)]
+        while open_heap:
+            _, _, g, cell = heapq.heappop(open_heap)
+            if cell == goal:
+                break
+            if g > best[cell]:
+                continue
+            x, y = cell
+            for dx, dy in _OFFSETS:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < width and 0 <= ny < height):
+                    continue
+                if not self._passable[ny][nx]:
+                    continue
+                ng = g + tile_cost(lookup.get(map_data.data[ny][nx]))
+                neighbor = (nx, ny)
+                if ng < best.get(neighbor, float("inf")):
+                    best[neighbor] = ng
+                    came_from[neighbor] = cell
+                    h = heuristic(nx, ny)
+                    heapq.heappush(open_heap, (ng + h, h, ng, neighbor))
+        else:
+            return None
+
+        path = [goal]
+        while path[-1] != start:
+            path.append(came_from[path[-1]])
+        path.reverse()
+        return path
+
+    # --- ラベルの構築と更新 ---
+
+    def rebuild(self):
+        """マップ全体のラベルを作り直す"""
+        map_data = self.map_data
+        width, height = map_data.width, map_data.height
+        passable_of = {
+            tile_id: is_tile_passable(tile)
+            for tile_id, tile in map_data.tile_lookup.items()
+        }
+        self._passable = [
+            [passable_of.get(tile_id, False) for tile_id in row]
+            for row in map_data.data
+        ]
+        self.labels = [[0] * width for _ in range(height)]
+        self._sizes = {}
+        self._next_label = 1
+        for y in range(height):
+            passable_row = self._passable[y]
+            label_row = self.labels[y]
+            for x in range(width):
+                if passable_row[x] and not label_row[x]:
+                    label = self._new_label()
+                    self._sizes[label] = self._flood(x, y, 0, label)
+        self._dirty = False
+
+    def _ensure_labels(self):
+        if self._dirty:
+            self.rebuild()
+
+    def _new_label(self):
+        label = self._next_label
+        self._next_label += 1
+        return label
+
+    def _on_map_changed(self, rect):
+        if self._dirty:
+            return
+        if rect is None:
+            self._dirty = True
+            return
+        x0, y0, w, h = rect
+        if w * h > INCREMENTAL_LIMIT:
+            self._dirty = True
+            return
+
+        lookup = self.map_data.tile_lookup
+        data = self.map_data.data
+        for y in range(y0, y0 + h):
+            for x in range(x0, x0 + w):
+                passable = is_tile_passable(lookup.get(data[y][x]))
+                if passable == self._passable[y][x]:
+                    continue
+                self._passable[y][x] = passable
+                if passable:
+                    self._open_cell(x, y)
+                else:
+                    self._close_cell(x, y)
+                if self._dirty:
+                    return
+
+    def _open_cell(self, x, y):
+        """通行不可→可: 隣接する領域を最大の領域に統合する"""
+        neighbor_labels = {}
+        for dx, dy in _OFFSETS:
+            label = self._label_at(x + dx, y + dy)
+            if label:
+                neighbor_labels[label] = (x + dx, y + dy)
+
+        if not neighbor_labels:
+            label = self._new_label()
+            self.labels[y][x] = label
+            self._sizes[label] = 1
+            return
+
+        target = max(neighbor_labels, key=self._sizes.__getitem__)
+        self.labels[y][x] = target
+        self._sizes[target] += 1
+        for label, (nx, ny) in neighbor_labels.items():
+            if label != target:
+                self._sizes[target] += self._flood(nx, ny, label, target)
+                del self._sizes[label]
+
+    def _close_cell(self, x, y):
+        """通行可→不可: 領域が分断された場合のみ、切り離された側を振り直す"""
+        old = self.labels[y][x]
+        self.labels[y][x] = 0
+        self._sizes[old] -= 1
+
+        # 周囲8マスを一周し、通行可能なマスの連なりごとに代表の隣接マスを1つ選ぶ
+        ring = [self._label_at(x + dx, y + dy) == old for dx, dy in _RING]
+        seeds = []
+        if not all(ring):
+            start = ring.index(False)
+            run_has_seed = False
+            for i in range(1, 9):
+                index = (start + i) % 8
+                if not ring[index]:
+                    run_has_seed = False
+                    continue
+                # 角のマスのみの連なりは上下左右の隣接マスを含まないので代表を持たない
+                if index % 2 == 0 and not run_has_seed:
+                    dx, dy = _RING[index]
+                    seeds.append((x + dx, y + dy))
+                    run_has_seed = True
+
+        if not self._sizes[old]:
+            del self._sizes[old]
+        if len(seeds) > 1:
+            self._split_region(old, seeds)
+
+    def _split_region(self, old, seeds):
+        """
+        各代表マスから同時に幅優先探索し、他の探索と合流しないまま
+        探索し尽くした側だけを新しいラベルに振り直す
+        """
+        count = len(seeds)
+        parent = list(range(count))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        width, height = self.map_data.width, self.map_data.height
+        # 分断された両側が大きい場合は全体の再計算の方が速いので、そちらに任せる
+        budget = width * height // 2
+        explored = 0
+        labels = self.labels
+        owner = {seed: i for i, seed in enumerate(seeds)}
+        fronts = [[seed] for seed in seeds]
+        visited = [[seed] for seed in seeds]
+        finished = set()
+
+        while True:
+            # 1周ごとに各探索を幅優先探索の1層分だけ進める
+            for i in range(count):
+                if not fronts[i] or find(i) in finished:
+                    continue
+                next_front = []
+                for cx, cy in fronts[i]:
+                    for dx, dy in _OFFSETS:
+                        nx, ny = cx + dx, cy + dy
+                        if not (0 <= nx < width and 0 <= ny < height):
+                            continue
+                        if labels[ny][nx] != old:
+                            continue
+                        cell = (nx, ny)
+                        j = owner.get(cell)
+                        if j is None:
+                            owner[cell] = i
+                            next_front.append(cell)
+                        elif find(j) != find(i):
+                            parent[find(j)] = find(i)
+                fronts[i] = next_front
+                visited[i].extend(next_front)
+                explored += len(next_front)
+            if explored > budget:
+                self._dirty = True
+                return
+
+            remaining = []
+            for root in {find(i) for i in range(count)} - finished:
+                members = [i for i in range(count) if find(i) == root]
+                if any(fronts[i] for i in members):
+                    remaining.append(root)
+                    continue
+                # 探索し尽くした = 他の代表マスとつながっていない独立した領域
+                finished.add(root)
+                label = self._new_label()
+                size = 0
+                for i in members:
+                    for cx, cy in visited[i]:
+                        labels[cy][cx] = label
+                    size += len(visited[i])
+                self._sizes[label] = size
+                self._sizes[old] -= size
+
+            if len(remaining) <= 1:
+                break
+
+        if old in self._sizes and not self._sizes[old]:
+            del self._sizes[old]
+
+    def _label_at(self, x, y):
+        if 0 <= x < self.map_data.width and 0 <= y < self.map_data.height:
+            return self.labels[y][x]
+        return 0
+
+    def _flood(self, x, y, from_label, to_label):
+        """(x, y) から from_label の連結成分を to_label に塗り替え、マス数を返す"""
+        width, height = self.map_data.width, self.map_data.height
+        labels = self.labels
+        passable = self._passable
+        labels[y][x] = to_label
+        queue = deque([(x, y)])
+        size = 0
+        while queue:
+            cx, cy = queue.popleft()
+            size += 1
+            for dx, dy in _OFFSETS:
+                nx, ny = cx + dx, cy + dy
+                if 0 <= nx < width and 0 <= ny < height:
+                    if labels[ny][nx] == from_label and passable[ny][nx]:
+                        labels[ny][nx] = to_label
+                        queue.append((nx, ny))
+        return size
@@ -0,0 +1,146 @@
+"""
+計測用の軽量なタイマー/カウンター
+
+無効時 (既定) は timer() が共有の何もしないオブジェクトを返し、count() も即座に戻るので
+ホットパスに置いてもほぼコストがかからない。環境変数 MAP_EDITOR_PROFILE=1 で起動時から有効になる
+"""
+import json
+import logging
+import os
+import time
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """名前付きのカウンター、所要時間、最新値 (ゲージ) を集計する"""
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        self.counters = {}
+        self.timings = {}  # name -> [回数, 合計秒, 最大秒, 直近秒]
+        self.gauges = {}
+
+    def timer(self, name):
+        """with metrics.timer("save_map"): ... の形で所要時間を記録する"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def add_time(self, name, seconds):
+        if not self.enabled:
+            return
+        entry = self.timings.get(name)
+        if entry is None:
+            self.timings[name] = [1, seconds, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] = seconds
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_value(self, name, value):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def hit_rate(self, prefix):
+        """prefix.hit / prefix.miss から求めたヒット率。記録が無ければ None"""
+        hits = self.counters.get(f"{prefix}.hit", 0)
+        total = hits + self.counters.get(f"{prefix}.miss", 0)
+        return hits / total if total else None
+
+    def rate(self, counter, timing):
+        """カウンターを所要時間の合計で割った毎秒の処理量。記録が無ければ None"""
+        entry = self.timings.get(timing)
+        if entry is None or entry[1] <= 0:
+            return None
+        return self.counters.get(counter, 0) / entry[1]
+
+    def snapshot(self):
+        """JSON に変換できる形で現在の集計を返す"""
+        return {
+            "enabled": self.enabled,
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "timings": {
+                name: {
+                    "count": count,
+                    "total_ms": total * 1000,
+                    "avg_ms": total * 1000 / count,
+                    "max_ms": longest * 1000,
+                    "last_ms": last * 1000,
+                }
+                for name, (count, total, longest, last) in self.timings.items()
+            },
+            "derived": {
+                "pixmap_cache.hit_rate": self.hit_rate("pixmap_cache"),
+                "chunk_cache.hit_rate": self.hit_rate("chunk_cache"),
+                "tileset_split.tiles_per_sec": self.rate("tileset_split.tiles", "tileset_split"),
+            },
+        }
+
+    def dump(self, file_path):
+        with open(file_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=4)
+
+
+def configure_logging(default_level="WARNING"):
+    """
+    環境変数 MAP_EDITOR_LOG_LEVEL (DEBUG/INFO/WARNING...) でログの詳細度を設定する
+    不正な値の場合は警告を出して default_level を使う
+    """
+    name = os.environ.get("MAP_EDITOR_LOG_LEVEL", default_level).upper()
+    # WARN や FATAL のような別名も数値のレベルに変換される
+    level = logging.getLevelName(name)
+    known = isinstance(level, int)
+    if not known:
+        level = logging.getLevelName(default_level)
+    logging.basicConfig(
+        level=level,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    if not known:
+        logging.getLogger(__name__).warning(
+            "Unknown MAP_EDITOR_LOG_LEVEL %r, using %s", name, default_level
+        )
+
+
+# アプリケーション全体で共有するインスタンス
+metrics = Metrics()
+if os.environ.get("MAP_EDITOR_PROFILE"):
+    metrics.enable()
@@ -0,0 +1,37 @@
+from array import array
+
+
+class TileRegion:
+    """矩形範囲のタイルIDを行優先で詰めたバッファ (コピー/貼り付けやスタンプに使う)"""
+
+    def __init__(self, width, height, data=None):
+        self.width = width
+        self.height = height
+        if data is None:
+            self.data = array("i", bytes(4 * width * height))
+        else:
+            self.data = array("i", data)
+        if len(self.data) != width * height:
+            raise ValueError(
+                f"Region data has {len(self.data)} tiles, expected {width * height}."
+            )
+
+    @classmethod
+    def filled(cls, width, height, tile_id):
+        return cls(width, height, array("i", [tile_id]) * (width * height))
+
+    def get(self, x, y):
+        return self.data[y * self.width + x]
+
+    def row(self, y, start=0, end=None):
+        """y 行目の [start, end) をリストで返す"""
+        offset = y * self.width
+        end = self.width if end is None else end
+        return self.data[offset + start : offset + end].tolist()
+
+    def to_dict(self):
+        return {"width": self.width, "height": self.height, "data": self.data.tolist()}
+
+    @classmethod
+    def from_dict(cls, info):
+        return cls(info["width"], info["height"], info["data"])
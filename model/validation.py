@@ -0,0 +1,107 @@
+"""マップファイル読み込み時の検証と修復"""
+import os
+from collections import Counter
+
+
+class MapValidationError(ValueError):
+    """修復しないと読み込めないマップ (データ長の不一致など)"""
+
+    def __init__(self, report):
+        super().__init__(report.summary())
+        self.report = report
+
+
+class MapValidationReport:
+    """検証結果。repaired は修復を適用して読み込んだかどうか"""
+
+    def __init__(self, width, height, data_length, unknown_ids, missing_images):
+        self.width = width
+        self.height = height
+        self.data_length = data_length
+        self.unknown_ids = unknown_ids  # 未定義のタイルID -> 出現数
+        self.missing_images = missing_images  # [(tile_id, path), ...]
+        self.repaired = False
+        self.fallback_tile_id = None
+
+    @property
+    def expected_length(self):
+        return self.width * self.height
+
+    @property
+    def length_mismatch(self):
+        return self.data_length != self.expected_length
+
+    @property
+    def needs_repair(self):
+        """フォールバックへの置き換えで直せる問題があるか"""
+        return self.length_mismatch or bool(self.unknown_ids)
+
+    @property
+    def ok(self):
+        return not self.needs_repair and not self.missing_images
+
+    def summary(self):
+        if self.ok:
+            return "No problems found."
+        lines = []
+        if self.length_mismatch:
+            lines.append(
+                f"Data length is {self.data_length}, expected "
+                f"{self.expected_length} ({self.width}x{self.height})."
+            )
+        if self.unknown_ids:
+            ids = ", ".join(str(tile_id) for tile_id in sorted(self.unknown_ids, key=str))
+            count = sum(self.unknown_ids.values())
+            lines.append(f"{count} cells use undefined tile IDs: {ids}.")
+        for tile_id, path in self.missing_images:
+            lines.append(f"Image for tile {tile_id} not found: {path}")
+        if self.repaired:
+            lines.append(f"Repaired using fallback tile {self.fallback_tile_id}.")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            "width": self.width,
+            "height": self.height,
+            "data_length": self.data_length,
+            "expected_length": self.expected_length,
+            "unknown_ids": {str(k): v for k, v in self.unknown_ids.items()},
+            "missing_images": [list(item) for item in self.missing_images],
+            "repaired": self.repaired,
+            "fallback_tile_id": self.fallback_tile_id,
+        }
+
+
+def validate_map_data(width, height, flat_data, tile_lookup, check_images=True):
+    """
+    平坦化されたタイル配列を検証する
+    出現するIDの種類を set で求めて未定義IDを判定し、出現数は未定義IDがあるときだけ数える
+    """
+    unknown = set(flat_data) - tile_lookup.keys()
+    unknown_ids = {}
+    if unknown:
+        unknown_ids = dict(Counter(tile_id for tile_id in flat_data if tile_id in unknown))
+    missing_images = []
+    if check_images:
+        for tile_id, tile in tile_lookup.items():
+            path = tile.get("image")
+            if path and not os.path.exists(path):
+                missing_images.append((tile_id, path))
+    return MapValidationReport(width, height, len(flat_data), unknown_ids, missing_images)
+
+
+def repair_map_data(flat_data, report, tile_lookup, fallback_tile_id):
+    """未定義IDをフォールバックに置き換え、データ長を width*height に揃えた配列を返す"""
+    if report.unknown_ids:
+        flat_data = [
+            tile_id if tile_id in tile_lookup else fallback_tile_id
+            for tile_id in flat_data
+        ]
+    expected = report.expected_length
+    if len(flat_data) > expected:
+        flat_data = flat_data[:expected]
+    elif len(flat_data) < expected:
+        flat_data = list(flat_data) + [fallback_tile_id] * (expected - len(flat_data))
+    report.repaired = True
+    report.fallback_tile_id = fallback_tile_id
+    return flat_data
@@ -0,0 +1,111 @@
+import unittest
+from model.autotile import NORTH, EAST, SOUTH, WEST
+from model.map_data import MapData
+from model.region import TileRegion
+
+
+def _water_tile_sets():
+    """A tileset whose water group declares a variant for every neighbor mask."""
+    tiles = [{"id": 0, "name": "Grass", "color": "#64b464"}]
+    for mask in range(16):
+        tiles.append({
+            "id": 100 + mask,
+            "name": f"Water{mask}",
+            "color": "#4fa3d1",
+            "autotile_group": "water",
+            "autotile_mask": mask,
+        })
+    return {"フィールド": tiles}
+
+
+class TestAutoTile(unittest.TestCase):
+    def setUp(self):
+        self.map_data = MapData(width=6, height=6, tile_sets=_water_tile_sets())
+
+    def test_single_tile_is_isolated_variant(self):
+        """A lone group tile gets the mask-0 variant."""
+        self.map_data.set_tile_id(2, 2, 115)
+        self.assertEqual(self.map_data.get_tile_id(2, 2), 100)
+
+    def test_neighbors_are_updated_incrementally(self):
+        """Painting next to a group tile updates the existing neighbor as well."""
+        self.map_data.set_tile_id(2, 2, 100)
+        self.map_data.set_tile_id(3, 2, 100)
+        self.assertEqual(self.map_data.get_tile_id(2, 2), 100 + EAST)
+        self.assertEqual(self.map_data.get_tile_id(3, 2), 100 + WEST)
+        # Cells without a group are never touched
+        self.assertEqual(self.map_data.get_tile_id(4, 2), 0)
+
+    def test_bulk_edit_reports_changed_cells(self):
+        """set_tiles returns the painted cells plus any rewritten neighbors."""
+        self.map_data.set_tile_id(2, 1, 100)
+        changed = self.map_data.set_tiles([(2, 2, 100), (2, 3, 100)])
+        self.assertEqual(set(changed), {(2, 2), (2, 3), (2, 1)})
+        self.assertEqual(self.map_data.get_tile_id(2, 1), 100 + SOUTH)
+        self.assertEqual(self.map_data.get_tile_id(2, 2), 100 + NORTH + SOUTH)
+        self.assertEqual(self.map_data.get_tile_id(2, 3), 100 + NORTH)
+
+    def test_full_pass_matches_incremental(self):
+        """autotile_all produces the same variants as incremental painting."""
+        cells = [(1, 1), (2, 1), (3, 1), (1, 2), (2, 2), (5, 5)]
+        for x, y in cells:
+            self.map_data.set_tile_id(x, y, 100)
+        expected = [row[:] for row in self.map_data.data]
+
+        other = MapData(width=6, height=6, tile_sets=_water_tile_sets())
+        for x, y in cells:
+            other.data[y][x] = 100
+        self.assertEqual(other.autotile_all(), 5)
+        self.assertEqual(other.data, expected)
+
+    def test_change_listener_receives_bounding_rect(self):
+        """Listeners get one rectangle covering all rewritten cells."""
+        rects = []
+        self.map_data.add_change_listener(rects.append)
+        self.map_data.set_tile_id(2, 2, 100)
+        self.map_data.set_tile_id(2, 3, 100)
+        self.assertEqual(rects, [(2, 2, 1, 1), (2, 2, 1, 2)])
+
+    def test_region_blit_updates_border(self):
+        """A pasted region re-tiles its edge and the cells just outside it."""
+        self.map_data.set_tile_id(1, 2, 100)
+        region = TileRegion(2, 1, [100 + EAST, 100 + WEST])
+        rect = self.map_data.blit_region(region, 2, 2)
+        self.assertEqual(rect, (1, 1, 4, 3))
+        self.assertEqual(self.map_data.get_tile_id(1, 2), 100 + EAST)
+        self.assertEqual(self.map_data.get_tile_id(2, 2), 100 + EAST + WEST)
+        self.assertEqual(self.map_data.get_tile_id(3, 2), 100 + WEST)
+
+    def test_fill_region_tiles_interior(self):
+        """A filled area gets interior variants, matching a full pass."""
+        map_data = MapData(width=10, height=10, tile_sets=_water_tile_sets())
+        map_data.fill_region(1, 1, 8, 8, 100)
+        self.assertEqual(map_data.get_tile_id(4, 4), 100 + NORTH + EAST + SOUTH + WEST)
+        self.assertEqual(map_data.get_tile_id(1, 1), 100 + EAST + SOUTH)
+        self.assertEqual(map_data.autotile_all(), 0)
+
+    def test_set_autotile_rule(self):
+        """Rules can be declared on existing tile definitions."""
+        map_data = MapData(width=4, height=4)
+        self.assertTrue(map_data.set_autotile_rule(2, "water"))
+        self.assertTrue(map_data.set_autotile_rule(6, "water", EAST))
+        map_data.set_tile_id(0, 0, 2)
+        map_data.set_tile_id(1, 0, 2)
+        self.assertEqual(map_data.get_tile_id(0, 0), 6)
+        self.assertEqual(map_data.get_tile_id(1, 0), 2)
+        self.assertFalse(map_data.set_autotile_rule(999, "water"))
+
+    def test_rule_change_retiles_existing_tiles(self):
+        """Tiles already on the map pick up a new rule and listeners are told."""
+        map_data = MapData(width=4, height=4)
+        map_data.set_tile_id(0, 0, 2)
+        map_data.set_tile_id(1, 0, 2)
+        rects = []
+        map_data.add_change_listener(rects.append)
+        self.assertEqual(map_data.set_autotile_rules([(2, "water", None), (6, "water", EAST)]), 2)
+        self.assertEqual(map_data.get_tile_id(0, 0), 6)
+        self.assertEqual(rects, [None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import unittest
+from model.edit_client import BackgroundEditClient, MapEditClient
+from model.edit_server import MapEditServer
+from model.map_data import MapData
+
+
+class _SlowDrainServer(MapEditServer):
+    """Applies and broadcasts another client's deltas while a snapshot is draining."""
+
+    async def _handle_client(self, reader, writer):
+        drain = writer.drain
+
+        async def drain_with_concurrent_edit():
+            self.apply_deltas([(1, 1, 5)])
+            self._flush()
+            await drain()
+
+        writer.drain = drain_with_concurrent_edit
+        await super()._handle_client(reader, writer)
+
+
+class TestMapEditServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server_map = MapData(width=8, height=6)
+        self.server = MapEditServer(self.server_map, flush_interval=0.01)
+        self.host, self.port = await self.server.start("127.0.0.1", 0)
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def _connect(self):
+        client = MapEditClient(MapData(width=2, height=2))
+        await client.connect(self.host, self.port)
+        self.addAsyncCleanup(client.close)
+        return client
+
+    async def test_subscribe_receives_snapshot(self):
+        """A new client loads the server's map on connect."""
+        self.server_map.set_tile_id(3, 2, 4)
+        client = await self._connect()
+        self.assertEqual(client.map_data.width, 8)
+        self.assertEqual(client.map_data.get_tile_id(3, 2), 4)
+
+    async def test_deltas_are_merged_and_broadcast(self):
+        """Batches sent within one flush interval arrive as one merged message."""
+        sender = await self._connect()
+        listener = await self._connect()
+
+        await sender.send_deltas([(0, 0, 1), (1, 0, 1)])
+        await sender.send_deltas([(1, 0, 2)])
+        cells = await asyncio.wait_for(listener.receive(), 1.0)
+        self.assertEqual(sorted(map(tuple, cells)), [(0, 0, 1), (1, 0, 2)])
+
+        changed = listener.apply_deltas(cells)
+        self.assertEqual(sorted(changed), [(0, 0), (1, 0)])
+        self.assertEqual(listener.map_data.get_tile_id(1, 0), 2)
+        self.assertEqual(self.server_map.get_tile_id(1, 0), 2)
+
+        # The sender also receives the merged result
+        echoed = await asyncio.wait_for(sender.receive(), 1.0)
+        self.assertEqual(sorted(map(tuple, echoed)), sorted(map(tuple, cells)))
+
+    async def test_invalid_deltas_are_dropped(self):
+        """Malformed cells and messages are ignored without closing the connection."""
+        sender = await self._connect()
+        with self.assertLogs("model.edit_server", level="WARNING") as logs:
+            sender._writer.write(b"not json\n[1, 2]\n")
+            await sender.send_deltas(
+                [(0, 0, "lava"), (1, "a", 3), (99, 0, 1), (2, 0, 999), (3, 0, 2)]
+            )
+            cells = await asyncio.wait_for(sender.receive(), 1.0)
+        self.assertEqual(len(logs.output), 3)
+        self.assertEqual(cells, [[3, 0, 2]])
+        self.assertEqual(self.server_map.get_tile_id(0, 0), 0)
+        self.assertEqual(self.server_map.get_tile_id(3, 0), 2)
+
+        # The connection is still usable afterwards
+        await sender.send_deltas([(4, 0, 1)])
+        cells = await asyncio.wait_for(sender.receive(), 1.0)
+        self.assertEqual(cells, [[4, 0, 1]])
+
+    async def test_background_client(self):
+        """The threaded client applies remote deltas only when polled."""
+        map_data = MapData(width=2, height=2)
+        listener_threads = []
+        map_data.add_change_listener(lambda rect: listener_threads.append(threading.get_ident()))
+        client = BackgroundEditClient(map_data)
+
+        def connect():
+            client.connect(self.host, self.port)
+            return threading.get_ident()
+
+        caller = await asyncio.to_thread(connect)
+        # The snapshot is loaded, and listeners notified, on the calling thread
+        self.assertEqual(map_data.width, 8)
+        self.assertEqual(listener_threads, [caller])
+        try:
+            sender = await self._connect()
+            await sender.send_deltas([(5, 5, 3)])
+            for _ in range(100):
+                changed = client.apply_pending()
+                if changed:
+                    break
+                await asyncio.sleep(0.01)
+            self.assertEqual(changed, [(5, 5)])
+            self.assertEqual(client.client.map_data.get_tile_id(5, 5), 3)
+        finally:
+            await asyncio.to_thread(client.close)
+
+
+class TestSubscribeRace(unittest.IsolatedAsyncioTestCase):
+    async def test_deltas_during_subscribe_are_delivered(self):
+        """Deltas flushed while the snapshot drains still reach the new client."""
+        server = _SlowDrainServer(MapData(width=4, height=4), flush_interval=0.01)
+        host, port = await server.start("127.0.0.1", 0)
+        self.addAsyncCleanup(server.close)
+        client = MapEditClient(MapData(width=2, height=2))
+        await client.connect(host, port)
+        self.addAsyncCleanup(client.close)
+
+        # The snapshot was taken before the edit, so it must arrive as a delta
+        self.assertEqual(client.map_data.get_tile_id(1, 1), 0)
+        cells = await asyncio.wait_for(client.receive(), 1.0)
+        client.apply_deltas(cells)
+        self.assertEqual(client.map_data.get_tile_id(1, 1), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
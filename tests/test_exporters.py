@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+from model.exporters import (
+    assign_gids,
+    export_csv,
+    export_packed,
+    export_tmx,
+    import_packed,
+    import_tmx,
+)
+from model.map_data import MapData
+
+# A map as saved by Tiled: the tileset is one sprite sheet and only
+# the tile carrying custom properties has its own <tile> element.
+_TILED_TMX = """<?xml version="1.0" encoding="UTF-8"?>
+<map version="1.10" tiledversion="1.10.2" orientation="orthogonal" renderorder="right-down"
+     width="2" height="2" tilewidth="32" tileheight="32" infinite="0" nextlayerid="2" nextobjectid="1">
+ <tileset firstgid="1" name="terrain" tilewidth="32" tileheight="32" tilecount="4" columns="2">
+  <image source="terrain.png" width="64" height="64"/>
+  <tile id="3">
+   <properties>
+    <property name="name" value="Water"/>
+    <property name="passable" type="bool" value="false"/>
+   </properties>
+  </tile>
+ </tileset>
+ <layer id="1" name="Ground" width="2" height="2">
+  <data encoding="csv">
+{gids}
+</data>
+ </layer>
+</map>
+"""
+
+
+class TestExporters(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.map_data = MapData(width=7, height=5)
+        for x in range(7):
+            self.map_data.set_tile_id(x, x % 5, x)
+        self.map_data.add_external_tile("tiles/rock.png", name="Rock")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _path(self, name):
+        return os.path.join(self.test_dir, name)
+
+    def test_assign_gids(self):
+        """Tilesets get consecutive firstgids starting at 1."""
+        layout, gid_of = assign_gids(self.map_data.tile_sets)
+        self.assertEqual([(name, firstgid) for name, firstgid, _ in layout],
+                         [("フィールド", 1), ("ダンジョン", 5), ("外部", 9)])
+        self.assertEqual(gid_of[0], 1)
+        self.assertEqual(gid_of[8], 9)
+
+    def test_tmx_round_trip(self):
+        """Both TMX encodings restore the grid and the tile definitions."""
+        for encoding in ("base64-zlib", "csv"):
+            path = self._path(f"map_{encoding}.tmx")
+            export_tmx(self.map_data, path, encoding=encoding, chunk_rows=2)
+            ET.parse(path)  # well-formed XML
+
+            loaded = import_tmx(path)
+            self.assertEqual((loaded.width, loaded.height), (7, 5))
+            self.assertEqual(loaded.data, self.map_data.data)
+            self.assertEqual(loaded.tile_sets, self.map_data.tile_sets)
+
+    def test_unknown_ids_import_as_fallback(self):
+        """Cells without a tile definition are written as gid 0."""
+        self.map_data.set_tile_id(0, 0, 999)
+        path = self._path("map.tmx")
+        export_tmx(self.map_data, path)
+        loaded = import_tmx(path)
+        self.assertEqual(loaded.get_tile_id(0, 0), 0)
+
+    def test_import_into_existing_map_notifies(self):
+        """Importing into an existing MapData replaces it and notifies listeners."""
+        path = self._path("map.tmx")
+        export_tmx(self.map_data, path)
+        target = MapData(width=2, height=2)
+        rects = []
+        target.add_change_listener(rects.append)
+        import_tmx(path, target)
+        self.assertEqual(target.data, self.map_data.data)
+        self.assertEqual(rects, [None])
+
+    def test_import_tiled_sprite_sheet(self):
+        """Tiled maps whose tilesets are one image get a tile for every gid."""
+        path = self._path("tiled.tmx")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(_TILED_TMX.format(gids="1,2,\n0,4"))
+        loaded = import_tmx(path)
+        tiles = loaded.tile_sets["terrain"]
+        self.assertEqual(len(tiles), 4)
+        self.assertEqual([tile["name"] for tile in tiles],
+                         ["terrain 0", "terrain 1", "terrain 2", "Water"])
+        self.assertFalse(tiles[3]["passable"])
+        ids = [tile["id"] for tile in tiles]
+        # gid 0 (empty) falls back to the first tile
+        self.assertEqual(loaded.data, [[ids[0], ids[1]], [ids[0], ids[3]]])
+
+    def test_import_rejects_undefined_gid(self):
+        """A gid outside every tileset is an error, not a silent fallback."""
+        path = self._path("bad.tmx")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(_TILED_TMX.format(gids="1,2,\n3,9"))
+        with self.assertRaises(ValueError):
+            import_tmx(path)
+
+    def test_packed_round_trip(self):
+        """Packed arrays round-trip with and without compression."""
+        for item_size, compress in ((1, False), (2, True), (4, True)):
+            path = self._path(f"map_{item_size}.bin")
+            export_packed(self.map_data, path, item_size=item_size, compress=compress)
+            loaded = import_packed(path)
+            self.assertEqual(loaded.data, self.map_data.data)
+
+        self.map_data.set_tile_id(0, 0, 300)
+        with self.assertRaises(ValueError):
+            export_packed(self.map_data, self._path("small.bin"), item_size=1)
+
+    def test_export_csv(self):
+        """CSV export writes one line per map row."""
+        path = self._path("map.csv")
+        export_csv(self.map_data, path)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual([int(v) for v in lines[1].split(",")], self.map_data.data[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
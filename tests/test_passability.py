@@ -0,0 +1,65 @@
+import unittest
+from model.map_data import MapData
+from model.passability import PassabilityMap
+
+FLOOR, WALL, MOUNTAIN = 0, 5, 3
+
+
+class TestPassability(unittest.TestCase):
+    def setUp(self):
+        self.map_data = MapData(width=7, height=5)
+        self.passability = PassabilityMap(self.map_data)
+
+    def _build_wall(self, x):
+        for y in range(self.map_data.height):
+            self.map_data.set_tile_id(x, y, WALL)
+
+    def test_open_map_is_one_region(self):
+        """A map without blocking tiles forms a single region."""
+        self.assertEqual(self.passability.region_count(), 1)
+        self.assertTrue(self.passability.is_reachable((0, 0), (6, 4)))
+
+    def test_wall_splits_and_reopening_merges(self):
+        """Regions are split and merged incrementally as tiles change."""
+        self.passability.region_count()
+        self._build_wall(3)
+        self.assertEqual(self.passability.region_count(), 2)
+        self.assertEqual(self.passability.region_of(3, 2), 0)
+        self.assertFalse(self.passability.is_reachable((0, 0), (6, 0)))
+
+        self.map_data.set_tile_id(3, 2, FLOOR)
+        self.assertEqual(self.passability.region_count(), 1)
+        self.assertTrue(self.passability.is_reachable((0, 0), (6, 0)))
+
+    def test_unreachable_path_is_rejected(self):
+        """find_path returns None when the cached labels differ."""
+        self._build_wall(3)
+        self.assertIsNone(self.passability.find_path((0, 0), (6, 4)))
+
+    def test_path_avoids_costly_tiles(self):
+        """A* prefers a detour over expensive tiles."""
+        for y in range(4):
+            self.map_data.set_tile_id(3, y, MOUNTAIN)
+        path = self.passability.find_path((0, 0), (6, 0))
+        self.assertEqual(path[0], (0, 0))
+        self.assertEqual(path[-1], (6, 0))
+        # Crossing the mountains costs 6 + 3 - 1 = 8; going around row 4 costs 14
+        self.assertNotIn((3, 4), path)
+        self.assertEqual(len(path), 7)
+
+        for y in range(4):
+            self.map_data.set_tile_id(3, y, WALL)
+        self.map_data.set_tile_id(3, 4, FLOOR)
+        path = self.passability.find_path((0, 0), (6, 0))
+        self.assertIn((3, 4), path)
+
+    def test_load_rebuilds_labels(self):
+        """Replacing the whole map invalidates the cached labels."""
+        self.passability.region_count()
+        self.map_data.resize(3, 3)
+        self.assertEqual(self.passability.region_count(), 1)
+        self.assertEqual(self.passability.region_of(5, 5), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
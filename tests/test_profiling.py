@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import tempfile
+import unittest
+from unittest import mock
+from model.map_data import MapData
+from model.profiling import Metrics, configure_logging, metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def test_disabled_records_nothing(self):
+        """When disabled, timers and counters are no-ops."""
+        m = Metrics()
+        with m.timer("work"):
+            pass
+        m.count("tiles", 5)
+        m.set_value("fps", 60)
+        self.assertEqual((m.counters, m.timings, m.gauges), ({}, {}, {}))
+
+    def test_enabled_records_timings_and_counters(self):
+        m = Metrics()
+        m.enable()
+        for _ in range(3):
+            with m.timer("work"):
+                pass
+        m.count("tiles", 2)
+        m.count("tiles")
+        m.set_value("fps", 30)
+        self.assertEqual(m.timings["work"][0], 3)
+        self.assertEqual(m.counters["tiles"], 3)
+        self.assertEqual(m.gauges["fps"], 30)
+
+    def test_derived_values(self):
+        """Hit rates and throughput are computed from the raw counters."""
+        m = Metrics()
+        m.enable()
+        self.assertIsNone(m.hit_rate("pixmap_cache"))
+        m.count("pixmap_cache.hit", 3)
+        m.count("pixmap_cache.miss", 1)
+        m.add_time("tileset_split", 0.5)
+        m.count("tileset_split.tiles", 100)
+        derived = m.snapshot()["derived"]
+        self.assertEqual(derived["pixmap_cache.hit_rate"], 0.75)
+        self.assertEqual(derived["tileset_split.tiles_per_sec"], 200)
+        self.assertIsNone(derived["chunk_cache.hit_rate"])
+
+    def test_dump_writes_json(self):
+        m = Metrics()
+        m.enable()
+        m.add_time("paint", 0.002)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "metrics.json")
+            m.dump(path)
+            with open(path) as f:
+                data = json.load(f)
+        self.assertAlmostEqual(data["timings"]["paint"]["avg_ms"], 2.0)
+        self.assertEqual(data["timings"]["paint"]["count"], 1)
+
+
+class TestMapDataInstrumentation(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        metrics.enable()
+
+    def tearDown(self):
+        metrics.enable(False)
+        metrics.reset()
+
+    def test_save_and_load_are_timed(self):
+        map_data = MapData(width=4, height=4)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "map.json")
+            map_data.save_map(path)
+            MapData().load_map(path, check_images=False)
+        self.assertEqual(metrics.timings["save_map"][0], 1)
+        self.assertEqual(metrics.timings["load_map"][0], 1)
+
+
+class TestConfigureLogging(unittest.TestCase):
+    def _configured_level(self, value, default="WARNING"):
+        with mock.patch.dict(os.environ, {"MAP_EDITOR_LOG_LEVEL": value}), \
+                mock.patch("logging.basicConfig") as basic_config:
+            configure_logging(default)
+        return basic_config.call_args.kwargs["level"]
+
+    def test_level_from_environment(self):
+        self.assertEqual(self._configured_level("debug"), logging.DEBUG)
+
+    def test_level_aliases_are_accepted(self):
+        """WARN and FATAL are valid names and must not produce a warning."""
+        with self.assertNoLogs("model.profiling"):
+            self.assertEqual(self._configured_level("warn"), logging.WARNING)
+            self.assertEqual(self._configured_level("fatal"), logging.CRITICAL)
+
+    def test_invalid_level_falls_back(self):
+        """An unknown level name does not stop the editor from starting."""
+        with self.assertLogs("model.profiling", level="WARNING"):
+            self.assertEqual(self._configured_level("loud", "INFO"), logging.INFO)
+
+
+if __name__ == '__main__':
+    unittest.main()
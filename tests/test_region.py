@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import unittest
+from model.map_data import MapData
+from model.region import TileRegion
+
+
+def _water_tile_sets():
+    """Grass plus a water group with a variant for every neighbor mask."""
+    tiles = [{"id": 0, "name": "Grass", "color": "#64b464"}]
+    for mask in range(16):
+        tiles.append({
+            "id": 100 + mask,
+            "name": f"Water{mask}",
+            "color": "#4fa3d1",
+            "autotile_group": "water",
+            "autotile_mask": mask,
+        })
+    return {"フィールド": tiles}
+
+
+class TestRegion(unittest.TestCase):
+    def setUp(self):
+        self.map_data = MapData(width=6, height=5)
+        for y in range(5):
+            for x in range(6):
+                self.map_data.data[y][x] = y * 10 + x
+
+    def test_copy_region_clips(self):
+        """Copying past the map edge returns only the overlapping part."""
+        region = self.map_data.copy_region(4, 3, 5, 5)
+        self.assertEqual((region.width, region.height), (2, 2))
+        self.assertEqual(region.data.tolist(), [34, 35, 44, 45])
+        self.assertEqual(self.map_data.copy_region(10, 10, 2, 2).width, 0)
+
+    def test_blit_clips_and_notifies_once(self):
+        """A blit past the edges writes the visible part and sends one rect."""
+        rects = []
+        self.map_data.add_change_listener(rects.append)
+        region = TileRegion(3, 3, range(100, 109))
+        rect = self.map_data.blit_region(region, -1, 3)
+        self.assertEqual(rect, (0, 3, 2, 2))
+        self.assertEqual(rects, [rect])
+        self.assertEqual(self.map_data.data[3][:3], [101, 102, 32])
+        self.assertEqual(self.map_data.data[4][:3], [104, 105, 42])
+
+    def test_undo_redo(self):
+        """Each blit is one undoable change."""
+        original = [row[:] for row in self.map_data.data]
+        self.map_data.fill_region(1, 1, 3, 2, 7)
+        filled = [row[:] for row in self.map_data.data]
+        self.assertEqual(self.map_data.data[2][1:4], [7, 7, 7])
+
+        self.assertEqual(len(self.map_data.undo()), 6)
+        self.assertEqual(self.map_data.data, original)
+        self.assertIsNone(self.map_data.undo())
+        self.map_data.redo()
+        self.assertEqual(self.map_data.data, filled)
+
+    def test_undo_keeps_later_edits(self):
+        """Undoing a paste leaves cells that were changed afterwards alone."""
+        self.map_data.fill_region(1, 1, 3, 2, 7)
+        # e.g. a remote delta applied after the paste
+        self.map_data.set_tiles([(2, 1, 9)])
+        restored = self.map_data.undo()
+        self.assertNotIn((2, 1), restored)
+        self.assertEqual(self.map_data.data[1][1:4], [11, 9, 13])
+        self.assertEqual(self.map_data.data[2][1:4], [21, 22, 23])
+
+    def test_undo_next_to_later_autotiled_edit(self):
+        """Variants rewritten by a neighbouring edit still undo, and get re-tiled."""
+        map_data = MapData(width=8, height=8, tile_sets=_water_tile_sets())
+        map_data.fill_region(2, 2, 3, 3, 100)
+        map_data.set_tile_id(5, 3, 100)
+        map_data.undo()
+        self.assertEqual(map_data.get_tile_id(4, 3), 0)
+        self.assertEqual(map_data.get_tile_id(5, 3), 100)
+        self.assertEqual(map_data.autotile_all(), 0)
+
+    def test_paint_stroke_is_one_undo_step(self):
+        """All tiles painted between begin_stroke and end_stroke undo together."""
+        original = [row[:] for row in self.map_data.data]
+        self.map_data.begin_stroke()
+        for x in range(4):
+            self.map_data.set_tile_id(x, 2, 7)
+        self.map_data.end_stroke()
+        self.assertEqual(sorted(self.map_data.undo()), [(x, 2) for x in range(4)])
+        self.assertEqual(self.map_data.data, original)
+        self.assertIsNone(self.map_data.undo())
+
+    def test_diagonal_stroke_records_only_touched_cells(self):
+        """A long diagonal drag is stored sparsely, not as its bounding box."""
+        map_data = MapData(width=300, height=300)
+        map_data.begin_stroke()
+        for i in range(300):
+            map_data.set_tile_id(i, i, 3)
+        map_data.end_stroke()
+        edit = map_data.history.pop_undo()
+        self.assertEqual(len(edit), 300)
+        self.assertEqual(sorted(x for x, _, _, _ in edit.cells()), list(range(300)))
+
+    def test_stamps_are_saved(self):
+        """Named stamps round-trip through save_map/load_map."""
+        test_dir = tempfile.mkdtemp()
+        try:
+            self.map_data.add_stamp("house", self.map_data.copy_region(0, 0, 2, 2))
+            path = os.path.join(test_dir, "map.json")
+            self.map_data.save_map(path)
+            loaded = MapData()
+            loaded.load_map(path)
+            self.assertEqual(loaded.stamps["house"].data.tolist(), [0, 1, 10, 11])
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_invalid_region_data(self):
+        """Region buffers must match their dimensions."""
+        with self.assertRaises(ValueError):
+            TileRegion(2, 2, [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
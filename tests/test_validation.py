@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from model.map_data import MapData
+from model.validation import MapValidationError
+
+
+class TestMapValidation(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "map.json")
+        map_data = MapData(width=4, height=3)
+        map_data.save_map(self.path)
+        with open(self.path) as f:
+            self.map_info = json.load(f)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _write(self, **changes):
+        self.map_info.update(changes)
+        with open(self.path, "w") as f:
+            json.dump(self.map_info, f)
+
+    def test_valid_map_reports_ok(self):
+        """A map saved by the editor passes validation."""
+        map_data = MapData()
+        map_data.load_map(self.path)
+        self.assertTrue(map_data.last_validation_report.ok)
+
+    def test_short_data_raises_without_repair(self):
+        """A truncated data array is rejected and the map is left unchanged."""
+        self._write(data=[0] * 10)
+        map_data = MapData(width=2, height=2)
+        with self.assertRaises(MapValidationError) as ctx:
+            map_data.load_map(self.path)
+        self.assertEqual(ctx.exception.report.data_length, 10)
+        self.assertEqual(ctx.exception.report.expected_length, 12)
+        self.assertEqual((map_data.width, map_data.height), (2, 2))
+
+    def test_bad_stamp_leaves_map_unchanged(self):
+        """A corrupt stamp fails the load before anything is replaced."""
+        self._write(stamps={"broken": {"width": 2, "height": 2, "data": [1]}})
+        map_data = MapData(width=2, height=2)
+        map_data.set_tile_id(0, 0, 5)
+        with self.assertRaises(ValueError):
+            map_data.load_map(self.path)
+        self.assertEqual((map_data.width, map_data.height), (2, 2))
+        self.assertEqual(map_data.get_tile_id(0, 0), 5)
+        self.assertEqual(map_data.stamps, {})
+
+    def test_repair_pads_and_remaps(self):
+        """repair=True pads short data and remaps unknown ids to the fallback."""
+        self._write(data=[1, 99, 99] + [2] * 7)
+        map_data = MapData()
+        map_data.load_map(self.path, repair=True, fallback_tile_id=3)
+        report = map_data.last_validation_report
+        self.assertTrue(report.repaired)
+        self.assertEqual(report.unknown_ids, {99: 2})
+        self.assertEqual(map_data.data[0], [1, 3, 3, 2])
+        self.assertEqual(map_data.data[2], [2, 2, 3, 3])
+
+    def test_unknown_ids_are_kept_without_repair(self):
+        """Unknown ids are reported but loaded as-is when not repairing."""
+        self._write(data=[42] + [0] * 11)
+        map_data = MapData()
+        map_data.load_map(self.path)
+        self.assertEqual(map_data.last_validation_report.unknown_ids, {42: 1})
+        self.assertEqual(map_data.get_tile_id(0, 0), 42)
+
+    def test_missing_images_are_reported(self):
+        """Image paths that do not exist are listed in the report."""
+        map_data = MapData(width=4, height=3)
+        tile_id = map_data.add_external_tile(os.path.join(self.test_dir, "none.png"))
+        map_data.save_map(self.path)
+        map_data.load_map(self.path)
+        report = map_data.last_validation_report
+        self.assertEqual(report.missing_images, [(tile_id, os.path.join(self.test_dir, "none.png"))])
+        self.assertFalse(report.ok)
+        self.assertFalse(report.needs_repair)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,11 +18,13 @@ from PyQt6.QtWidgets import (
     QDialog,
     QFormLayout,
     QDialogButtonBox,
+    QLineEdit,
 )
 from PyQt6.QtGui import QAction, QIcon, QPixmap
-from PyQt6.QtCore import Qt, QSize
+from PyQt6.QtCore import Qt, QSize, QRect
 
 from .map_widget import MapWidget
+from .tile_watcher import TileImageWatcher
 
 
 class TilesetSplitDialog(QDialog):
@@ -53,6 +55,14 @@ class TilesetSplitDialog(QDialog):
         form_layout.addRow("横の分割数:", self.h_spin)
         form_layout.addRow("縦の分割数:", self.v_spin)
 
+        # 入力すると、左上から順に並んだ先頭16タイルを近傍マスク 0〜15 のバリアントとして登録する
+        self.autotile_edit = QLineEdit()
+        self.autotile_edit.setPlaceholderText("(なし)")
+        self.autotile_edit.setToolTip(
+            "左上から順に、近傍マスク 0〜15 (北=1, 東=2, 南=4, 西=8 の和) のタイルとして登録します"
+        )
+        form_layout.addRow("オートタイルグループ:", self.autotile_edit)
+
         layout.addLayout(form_layout)
 
         self.preview_label = QLabel("")
@@ -75,6 +85,10 @@ class TilesetSplitDialog(QDialog):
     def get_values(self):
         return self.h_spin.value(), self.v_spin.value()
 
+    def get_autotile_group(self):
+        """空欄なら None"""
+        return self.autotile_edit.text().strip() or None
+
 
 # --- MainWindow: アプリケーションのメインフレーム ---
 class MainWindow(QMainWindow):
@@ -98,8 +112,17 @@ class MainWindow(QMainWindow):
         self.map_scroll_area.setMinimumSize(200, 200)
         self.map_widget = MapWidget(self.controller.map_data, self.controller)
         self.map_scroll_area.setWidget(self.map_widget)
+        # スクロール位置の変化を MapWidget に伝え、進行方向のタイルを先読みさせる
+        self.map_scroll_area.horizontalScrollBar().valueChanged.connect(self._on_map_scrolled)
+        self.map_scroll_area.verticalScrollBar().valueChanged.connect(self._on_map_scrolled)
         main_layout.addWidget(self.map_scroll_area, 0, 0, 1, 1)
 
+        # タイル画像の変更を監視し、変更された画像だけを差し替える
+        self._tile_buttons: dict[int, QPushButton] = {}
+        self.tile_watcher = TileImageWatcher(self.controller.map_data, self)
+        self.tile_watcher.images_reloaded.connect(self.map_widget.reload_images)
+        self.tile_watcher.images_reloaded.connect(self._refresh_tile_icons)
+
         # 2. タイルセット選択エリア
         control_panel = QWidget()
         control_panel.setMinimumWidth(200)  # 最小幅を設定
@@ -142,12 +165,23 @@ class MainWindow(QMainWindow):
         size_layout.addWidget(QLabel("高さ"))
         size_layout.addWidget(self.height_spin)
 
-        resize_button = QPushButton("サイズ変更")
-        resize_button.clicked.connect(self.on_resize_requested)
-        size_layout.addWidget(resize_button)
+        self.resize_button = QPushButton("サイズ変更")
+        self.resize_button.clicked.connect(self.on_resize_requested)
+        size_layout.addWidget(self.resize_button)
 
         control_layout.addWidget(size_group)
 
+        # スタンプ (選択範囲を保存した複数タイルのブラシ)
+        stamp_group = QGroupBox("スタンプ")
+        stamp_layout = QHBoxLayout(stamp_group)
+        self.stamp_combo = QComboBox()
+        self.stamp_combo.activated.connect(self.on_stamp_selected)
+        stamp_layout.addWidget(self.stamp_combo, 1)
+        select_button = QPushButton("範囲選択")
+        select_button.clicked.connect(lambda: self.map_widget.set_tool("select"))
+        stamp_layout.addWidget(select_button)
+        control_layout.addWidget(stamp_group)
+
         # ファイル操作 (保存/読み込み)
         file_group = QGroupBox("ファイル操作")
         file_layout = QHBoxLayout(file_group)
@@ -156,9 +190,9 @@ class MainWindow(QMainWindow):
         save_button.clicked.connect(self.controller.save_map)
         file_layout.addWidget(save_button)
 
-        load_button = QPushButton("読み込み")
-        load_button.clicked.connect(self.controller.load_map)
-        file_layout.addWidget(load_button)
+        self.load_button = QPushButton("読み込み")
+        self.load_button.clicked.connect(self.controller.load_map)
+        file_layout.addWidget(self.load_button)
 
         control_layout.addWidget(file_group)
 
@@ -182,6 +216,21 @@ class MainWindow(QMainWindow):
         self.load_tileset_button.clicked.connect(self.controller.load_external_tileset)
         control_layout.addWidget(self.load_tileset_button)
 
+    def set_shared_editing(self, shared):
+        """
+        共同編集中は、サーバーと共有できない操作 (サイズ変更・読み込み・タイル追加) を無効にする
+        """
+        for widget in (
+            self.resize_button,
+            self.load_button,
+            self.load_tile_button,
+            self.load_tileset_button,
+            self.load_action,
+            self.import_tmx_action,
+        ):
+            widget.setEnabled(not shared)
+            widget.setToolTip("Not available while connected to an edit server." if shared else "")
+
     def _create_actions(self):
         # 保存アクション
         self.save_action = QAction("&Save Map", self)
@@ -191,10 +240,81 @@ class MainWindow(QMainWindow):
         self.load_action = QAction("&Load Map", self)
         self.load_action.setShortcut("Ctrl+O")
 
+        # Tiled (TMX) 形式の書き出し/読み込み
+        self.export_tmx_action = QAction("&Export TMX...", self)
+        self.import_tmx_action = QAction("&Import TMX...", self)
+
+        # 編集 (矩形単位の操作のみ Undo 対象)
+        self.undo_action = QAction("&Undo", self)
+        self.undo_action.setShortcut("Ctrl+Z")
+        self.redo_action = QAction("&Redo", self)
+        self.redo_action.setShortcut("Ctrl+Y")
+        self.select_action = QAction("&Select Area", self)
+        self.select_action.setShortcut("S")
+        self.select_action.triggered.connect(lambda: self.map_widget.set_tool("select"))
+        self.copy_action = QAction("&Copy", self)
+        self.copy_action.setShortcut("Ctrl+C")
+        self.cut_action = QAction("Cu&t", self)
+        self.cut_action.setShortcut("Ctrl+X")
+        self.paste_action = QAction("&Paste", self)
+        self.paste_action.setShortcut("Ctrl+V")
+        self.save_stamp_action = QAction("Save Selection as S&tamp...", self)
+        self.paint_tool_action = QAction("&Paint Tool", self)
+        self.paint_tool_action.setShortcut("Esc")
+        self.paint_tool_action.triggered.connect(lambda: self.map_widget.set_tool("paint"))
+
+        # 通行可否オーバーレイ (右クリックで経路の始点/終点を指定)
+        self.passability_action = QAction("&Passability Overlay", self)
+        self.passability_action.setCheckable(True)
+        self.passability_action.toggled.connect(self.map_widget.set_passability_overlay)
+
+        # 計測 (オーバーレイ表示中は計測が有効になる)
+        self.perf_overlay_action = QAction("Performance &Overlay", self)
+        self.perf_overlay_action.setCheckable(True)
+        self.perf_overlay_action.setShortcut("F3")
+        self.perf_overlay_action.toggled.connect(self.map_widget.set_perf_overlay)
+        self.dump_metrics_action = QAction("&Dump Metrics...", self)
+
     def _create_menus(self):
         file_menu = self.menuBar().addMenu("&File")
         file_menu.addAction(self.save_action)
         file_menu.addAction(self.load_action)
+        file_menu.addSeparator()
+        file_menu.addAction(self.export_tmx_action)
+        file_menu.addAction(self.import_tmx_action)
+
+        edit_menu = self.menuBar().addMenu("&Edit")
+        edit_menu.addAction(self.undo_action)
+        edit_menu.addAction(self.redo_action)
+        edit_menu.addSeparator()
+        edit_menu.addAction(self.select_action)
+        edit_menu.addAction(self.paint_tool_action)
+        edit_menu.addAction(self.copy_action)
+        edit_menu.addAction(self.cut_action)
+        edit_menu.addAction(self.paste_action)
+        edit_menu.addAction(self.save_stamp_action)
+
+        view_menu = self.menuBar().addMenu("&View")
+        view_menu.addAction(self.passability_action)
+        view_menu.addSeparator()
+        view_menu.addAction(self.perf_overlay_action)
+        view_menu.addAction(self.dump_metrics_action)
+
+    def _on_map_scrolled(self):
+        viewport = self.map_scroll_area.viewport()
+        self.map_widget.on_viewport_changed(
+            QRect(
+                self.map_scroll_area.horizontalScrollBar().value(),
+                self.map_scroll_area.verticalScrollBar().value(),
+                viewport.width(),
+                viewport.height(),
+            )
+        )
+
+    def closeEvent(self, event):
+        # 描画中のワーカースレッドを止めてから終了する
+        self.map_widget.prefetcher.shutdown()
+        super().closeEvent(event)
 
     def update_map_widget(self):
         """マップデータが読み込まれたときなどにMapWidgetを更新/再描画する"""
@@ -207,7 +327,9 @@ class MainWindow(QMainWindow):
 
     def _initialize_controls(self):
         self._populate_tileset_combo()
+        self.populate_stamp_combo()
         self._sync_dimension_controls()
+        self.tile_watcher.sync_paths()
 
     def _populate_tileset_combo(self):
         names = self.controller.map_data.get_tileset_names()
@@ -237,6 +359,7 @@ class MainWindow(QMainWindow):
                 self.tile_button_group.removeButton(button)
             child.deleteLater()
 
+        self._tile_buttons.clear()
         tiles = self.controller.map_data.get_tiles_for_set(tileset_name)
         for idx, tile in enumerate(tiles):
             button = QPushButton(tile["name"])
@@ -261,6 +384,7 @@ class MainWindow(QMainWindow):
                 lambda checked, tile_id=tile["id"]: self.on_tile_selected(tile_id)
             )
             self.tile_button_group.addButton(button)
+            self._tile_buttons[tile["id"]] = button
             row = idx // 2
             col = idx % 2
             self.tile_buttons_layout.addWidget(button, row, col)
@@ -268,6 +392,19 @@ class MainWindow(QMainWindow):
             if tile["id"] == self.controller.map_data.current_tile_id:
                 button.setChecked(True)
 
+    def _refresh_tile_icons(self, images):
+        """差し替えられた画像を使っているタイルボタンのアイコンのみ更新"""
+        for tile_id, button in self._tile_buttons.items():
+            tile = self.controller.map_data.get_tile_definition(tile_id)
+            image = images.get(tile.get("image")) if tile else None
+            if image is None:
+                continue
+            if image.isNull():
+                button.setIcon(QIcon())
+            else:
+                button.setIcon(QIcon(QPixmap.fromImage(image)))
+                button.setIconSize(QSize(32, 32))
+
     def _sync_dimension_controls(self):
         self.width_spin.blockSignals(True)
         self.height_spin.blockSignals(True)
@@ -282,8 +419,16 @@ class MainWindow(QMainWindow):
         if self.controller.set_current_tileset(name):
             self._populate_tile_buttons(name)
 
+    def populate_stamp_combo(self):
+        self.stamp_combo.clear()
+        self.stamp_combo.addItems(list(self.controller.map_data.stamps))
+
+    def on_stamp_selected(self, index):
+        self.controller.select_stamp(self.stamp_combo.itemText(index))
+
     def on_tile_selected(self, tile_id):
         self.controller.set_current_tile(tile_id)
+        self.map_widget.set_tool("paint")
 
     def on_resize_requested(self):
         new_width = self.width_spin.value()
@@ -293,4 +438,6 @@ class MainWindow(QMainWindow):
     def refresh_from_model(self):
         """外部から呼び出してUI全体をModelに同期させる"""
         self._populate_tileset_combo()
+        self.populate_stamp_combo()
         self.update_map_widget()
+        self.tile_watcher.sync_paths()
@@ -1,6 +1,18 @@
+import time
+
 from PyQt6.QtWidgets import QWidget
 from PyQt6.QtGui import QPainter, QBrush, QColor, QPen, QMouseEvent, QPixmap
-from PyQt6.QtCore import Qt, QRect
+from PyQt6.QtCore import Qt, QRect, QPoint, QSize, QTimer
+
+from model.profiling import metrics
+from .tile_renderer import CHUNK_TILES, ChunkPrefetcher
+
+# スクロール速度から何秒先の表示位置まで先読みするか
+PREFETCH_LOOKAHEAD = 0.3
+# 1回のスクロールで先読みを依頼するチャンク数の上限
+PREFETCH_BATCH = 12
+# マップ変更後に表示中の経路を探索し直すまでの待ち時間 (ms)。ドラッグ中は探索しない
+PATH_UPDATE_DELAY_MS = 150
 
 
 # --- MapWidget: 実際にマップを描画するカスタムウィジェット ---
@@ -11,10 +23,47 @@ class MapWidget(QWidget):
         self.controller = controller
         self._pixmap_cache: dict[tuple[str, int], QPixmap] = {}
 
+        # スクロール先のチャンクをバックグラウンドで描画しておく
+        self.prefetcher = ChunkPrefetcher(map_data, self)
+        self.prefetcher.chunk_ready.connect(self._on_chunk_ready)
+        self._last_viewport = None
+        self._last_viewport_time = 0.0
+        self._scroll_velocity = (0.0, 0.0)  # px/s
+
         self.update_dimensions()
+        # オートタイルで周囲のセルが変わることもあるため、Modelの変更通知で再描画する
+        self.map_data.add_change_listener(self._on_map_changed)
         self.setMouseTracking(True)  # マウス移動をトラッキング
         self.dragging = False  # ドラッグ状態の初期化
 
+        # 通行可否オーバーレイ (領域の色分けと経路表示)
+        self.show_passability = False
+        self.path_start = None
+        self.path_goal = None
+        self.path_cells = None
+        # 変更のたびに A* を実行しないよう、変更が落ち着いてから1回だけ探索し直す
+        self._path_timer = QTimer(self)
+        self._path_timer.setSingleShot(True)
+        self._path_timer.setInterval(PATH_UPDATE_DELAY_MS)
+        self._path_timer.timeout.connect(self._refresh_path)
+
+        # 編集ツール: "paint" (1マス塗り) / "select" (矩形選択) / "stamp" (TileRegion の貼り付け)
+        self.tool = "paint"
+        self.selection = None  # (x, y, w, h) タイル座標
+        self._select_anchor = None
+        self.stamp = None
+        self._hover_cell = None
+
+        # パフォーマンスオーバーレイ (表示中は一定間隔で数値を更新する)
+        self.show_perf_overlay = False
+        self._metrics_were_enabled = metrics.enabled
+        self._perf_overlay_rect = QRect()
+        # 描画中のフレームを計測に含めるか (オーバーレイ自身の定期更新は含めない)
+        self._record_frame = False
+        self._perf_timer = QTimer(self)
+        self._perf_timer.setInterval(500)
+        self._perf_timer.timeout.connect(self._refresh_perf_overlay)
+
     def update_dimensions(self):
         """現在のマップサイズに合わせてウィジェットの大きさを再設定"""
         self.setFixedSize(
@@ -23,15 +72,201 @@ class MapWidget(QWidget):
         )
         self.updateGeometry()
         self._pixmap_cache.clear()
+        self.prefetcher.clear(images=True)
 
-    def paintEvent(self, event):
-        """描画処理。表示領域のタイルのみを描画（最適化）"""
-        painter = QPainter(self)
+    def on_viewport_changed(self, viewport: QRect):
+        """スクロールのたびに呼ばれ、速度と方向から先読みするチャンクを決める"""
+        now = time.monotonic()
+        if self._last_viewport is not None:
+            dt = now - self._last_viewport_time
+            if dt > 0:
+                vx = (viewport.x() - self._last_viewport.x()) / dt
+                vy = (viewport.y() - self._last_viewport.y()) / dt
+                # 急な変化を抑えるため直前の速度と平均を取る
+                old_vx, old_vy = self._scroll_velocity
+                self._scroll_velocity = ((old_vx + vx) / 2, (old_vy + vy) / 2)
+        self._last_viewport = QRect(viewport)
+        self._last_viewport_time = now
+        self._prefetch_around(viewport)
+        if self.show_perf_overlay:
+            self._refresh_perf_overlay()
+
+    def _prefetch_around(self, viewport: QRect):
+        ts = self.map_data.tile_size
+        chunk_px = CHUNK_TILES * ts
+        vx, vy = self._scroll_velocity
+        # 進行方向へは速度に応じて (最大4チャンク分)、それ以外へは1チャンク分広げる
+        limit = chunk_px * 4
+        dx = max(-limit, min(limit, int(vx * PREFETCH_LOOKAHEAD)))
+        dy = max(-limit, min(limit, int(vy * PREFETCH_LOOKAHEAD)))
+        area = viewport.adjusted(
+            -chunk_px + min(dx, 0), -chunk_px + min(dy, 0),
+            chunk_px + max(dx, 0), chunk_px + max(dy, 0),
+        )
+
+        center = viewport.center() + QPoint(dx, dy)
+        keys = []
+        for cy in range(max(0, area.top() // chunk_px), area.bottom() // chunk_px + 1):
+            for cx in range(max(0, area.left() // chunk_px), area.right() // chunk_px + 1):
+                keys.append((cx, cy))
+        # 予測した表示位置に近いチャンクから描画する
+        keys.sort(
+            key=lambda k: abs((k[0] + 0.5) * chunk_px - center.x())
+            + abs((k[1] + 0.5) * chunk_px - center.y())
+        )
+        self.prefetcher.request(keys[:PREFETCH_BATCH])
+
+    def reload_images(self, images):
+        """
+        差し替えられたタイル画像 ({path: QImage}) を反映する
+        該当画像のキャッシュのみ更新し、そのタイルを使っているセルだけを再描画する
+        """
         ts = self.map_data.tile_size
+        paths = set(images)
+        for key in [key for key in self._pixmap_cache if key[0] in paths]:
+            del self._pixmap_cache[key]
+        for path, image in images.items():
+            if image.isNull():
+                self._pixmap_cache[(path, ts)] = QPixmap()
+            else:
+                self._pixmap_cache[(path, ts)] = QPixmap.fromImage(
+                    image.scaled(ts, ts, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+                )
+        self.prefetcher.discard_images(paths)
+
+        tile_ids = {
+            tile_id
+            for tile_id, tile in self.map_data.tile_lookup.items()
+            if tile.get("image") in paths
+        }
+        if not tile_ids:
+            return
 
+        # 該当タイルを含むセルをチャンクごとの外接矩形にまとめて再描画する
+        bounds = {}
+        for y, row in enumerate(self.map_data.data):
+            if tile_ids.isdisjoint(row):
+                continue
+            cy = y // CHUNK_TILES
+            for x, tile_id in enumerate(row):
+                if tile_id in tile_ids:
+                    key = (x // CHUNK_TILES, cy)
+                    box = bounds.get(key)
+                    if box is None:
+                        bounds[key] = [x, y, x, y]
+                    else:
+                        box[0] = min(box[0], x)
+                        box[2] = max(box[2], x)
+                        box[3] = y
+        for key, (x0, y0, x1, y1) in bounds.items():
+            self.prefetcher.invalidate(x0, y0, x1 - x0 + 1, y1 - y0 + 1)
+            self.update(QRect(x0 * ts, y0 * ts, (x1 - x0 + 1) * ts, (y1 - y0 + 1) * ts))
+
+    def _on_chunk_ready(self, key):
+        chunk_px = CHUNK_TILES * self.map_data.tile_size
+        self.update(QRect(key[0] * chunk_px, key[1] * chunk_px, chunk_px, chunk_px))
+
+    def set_tool(self, tool, stamp=None):
+        """編集ツールを切り替える。tool="stamp" のときは貼り付ける TileRegion を渡す"""
+        self._update_stamp_preview(self._hover_cell)  # 古い枠を消す
+        self.tool = tool
+        self.stamp = stamp if tool == "stamp" else None
+        if tool != "select":
+            self._set_selection(None)
+        self._update_stamp_preview(self._hover_cell)
+
+    def _cell_rect(self, x, y, w, h):
+        ts = self.map_data.tile_size
+        # 枠線の太さぶん1px広げて再描画する
+        return QRect(x * ts, y * ts, w * ts, h * ts).adjusted(-1, -1, 1, 1)
+
+    def _set_selection(self, selection):
+        if self.selection is not None:
+            self.update(self._cell_rect(*self.selection))
+        self.selection = selection
+        if selection is not None:
+            self.update(self._cell_rect(*selection))
+
+    def _update_stamp_preview(self, cell):
+        """cell を左上とするスタンプの枠の範囲を再描画する"""
+        if self.stamp is not None and cell is not None:
+            self.update(self._cell_rect(cell[0], cell[1], self.stamp.width, self.stamp.height))
+
+    def set_perf_overlay(self, visible):
+        """オーバーレイの表示中は計測を有効にし、閉じたら元の状態に戻す"""
+        if visible and not self.show_perf_overlay:
+            self._metrics_were_enabled = metrics.enabled
+            metrics.enable()
+            self._perf_timer.start()
+        elif not visible and self.show_perf_overlay:
+            metrics.enable(self._metrics_were_enabled)
+            self._perf_timer.stop()
+        self.show_perf_overlay = visible
+        self._refresh_perf_overlay()
+
+    def _refresh_perf_overlay(self):
+        # スクロールで位置が変わるので、前回の位置と今回の位置の両方を再描画する
+        self.update(self._perf_overlay_rect)
+        visible = self.visibleRegion().boundingRect()
+        self._perf_overlay_rect = QRect(visible.topLeft() + QPoint(8, 8), QSize(280, 130))
+        if self.show_perf_overlay:
+            self.update(self._perf_overlay_rect)
+
+    def set_passability_overlay(self, visible):
+        self.show_passability = visible
+        if not visible:
+            self.path_start = self.path_goal = self.path_cells = None
+            self._path_timer.stop()
+        self.update()
+
+    def _refresh_path(self):
+        if self.dragging:
+            # ストロークが終わるまで待つ
+            self._path_timer.start()
+            return
+        self._update_path()
+        self.update()
+
+    def _update_path(self):
+        if self.path_start is not None and self.path_goal is not None:
+            self.path_cells = self.controller.find_path(self.path_start, self.path_goal)
+        else:
+            self.path_cells = None
+
+    def _on_map_changed(self, rect):
+        """Modelの変更範囲のみ再描画"""
+        if rect is None:
+            self.prefetcher.clear()
+        else:
+            self.prefetcher.invalidate(*rect)
+        if self.show_passability:
+            # 領域の統合・分断で離れたセルの色も変わるため全体を再描画する
+            if self.path_start is not None and self.path_goal is not None:
+                self._path_timer.start()
+            self.update()
+            return
+        if rect is None:
+            self.update()
+            return
+        ts = self.map_data.tile_size
+        x, y, w, h = rect
+        self.update(QRect(x * ts, y * ts, w * ts, h * ts))
+
+    def paintEvent(self, event):
+        """描画処理。表示領域のタイルのみを描画（最適化）"""
         # 描画が必要な領域を取得
         update_rect = event.rect()
 
+        # オーバーレイの範囲だけの再描画 (表示の定期更新) は実際のフレームとして記録しない
+        profiling = metrics.enabled and not (
+            self.show_perf_overlay and self._perf_overlay_rect.contains(update_rect)
+        )
+        self._record_frame = profiling
+        if profiling:
+            frame_start = time.perf_counter()
+        painter = QPainter(self)
+        ts = self.map_data.tile_size
+
         # 描画が必要なタイルの範囲を計算
         start_x = max(0, update_rect.left() // ts)
         start_y = max(0, update_rect.top() // ts)
@@ -41,56 +276,212 @@ class MapWidget(QWidget):
         # グリッド線用のペン
         grid_pen = QPen(QColor(100, 100, 100), 1)
 
-        # 表示領域内のタイルのみを描画
-        for y in range(start_y, end_y):
-            for x in range(start_x, end_x):
-                tile_id = self.map_data.get_tile_id(x, y)
-                rect = QRect(x * ts, y * ts, ts, ts)
-
-                # タイルの描画
-                tile_def = self.map_data.get_tile_definition(tile_id)
-                if tile_def and tile_def.get("image"):
-                    path = tile_def["image"]
-                    key = (path, ts)
-                    pix = self._pixmap_cache.get(key)
-                    if pix is None:
-                        original = QPixmap(path)
-                        if not original.isNull():
-                            pix = original.scaled(ts, ts, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                        else:
-                            pix = QPixmap()
-                        self._pixmap_cache[key] = pix
-
-                    if not pix.isNull():
-                        painter.drawPixmap(rect, pix)
-                    else:
-                        painter.setBrush(QBrush(QColor("#000000")))
-                        painter.setPen(grid_pen)
-                        painter.drawRect(rect)
+        # 先読み済みのチャンクは画像を1枚貼るだけで済ませ、残りをタイル単位で描画する
+        chunk_px = CHUNK_TILES * ts
+        missing = []
+        blitted = 0
+        tiles_drawn = 0
+        for cy in range(start_y // CHUNK_TILES, (end_y - 1) // CHUNK_TILES + 1):
+            for cx in range(start_x // CHUNK_TILES, (end_x - 1) // CHUNK_TILES + 1):
+                image = self.prefetcher.take((cx, cy))
+                if image is not None:
+                    painter.drawImage(QPoint(cx * chunk_px, cy * chunk_px), image)
+                    blitted += 1
+                    continue
+                missing.append((cx, cy))
+                ys = range(max(start_y, cy * CHUNK_TILES), min(end_y, (cy + 1) * CHUNK_TILES))
+                xs = range(max(start_x, cx * CHUNK_TILES), min(end_x, (cx + 1) * CHUNK_TILES))
+                tiles_drawn += len(ys) * len(xs)
+                for y in ys:
+                    for x in xs:
+                        self._draw_tile(painter, x, y, grid_pen)
+        # 表示中の未描画チャンクも次回以降のために描画しておく
+        # (ドラッグ中は描画してもすぐ無効化されるので依頼しない)
+        if missing and not self.dragging:
+            self.prefetcher.request(missing)
+
+        if self.show_passability:
+            self._draw_passability(painter, start_x, start_y, end_x, end_y)
+
+        # 選択範囲とスタンプの貼り付け位置の枠
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        if self.selection is not None:
+            painter.setPen(QPen(QColor(255, 255, 255), 2, Qt.PenStyle.DashLine))
+            x, y, w, h = self.selection
+            painter.drawRect(QRect(x * ts, y * ts, w * ts, h * ts))
+        if self.stamp is not None and self._hover_cell is not None:
+            painter.setPen(QPen(QColor(255, 215, 0), 2))
+            x, y = self._hover_cell
+            painter.drawRect(QRect(x * ts, y * ts, self.stamp.width * ts, self.stamp.height * ts))
+
+        if profiling:
+            metrics.add_time("paint", time.perf_counter() - frame_start)
+            metrics.count("paint.tiles_drawn", tiles_drawn)
+            metrics.count("chunk_cache.hit", blitted)
+            metrics.count("chunk_cache.miss", len(missing))
+            metrics.set_value("paint.last_tiles_drawn", tiles_drawn)
+            metrics.set_value("paint.last_chunks_blitted", blitted)
+        if self.show_perf_overlay and update_rect.intersects(self._perf_overlay_rect):
+            self._draw_perf_overlay(painter)
+
+    def _draw_perf_overlay(self, painter):
+        """計測値を表示領域の左上に描画"""
+        snapshot = metrics.snapshot()
+        timings = snapshot["timings"]
+        derived = snapshot["derived"]
+
+        def ms(name, key="last_ms"):
+            entry = timings.get(name)
+            return f"{entry[key]:.1f} ms" if entry else "-"
+
+        def percent(value):
+            return f"{value * 100:.0f}%" if value is not None else "-"
+
+        split_rate = derived["tileset_split.tiles_per_sec"]
+        lines = [
+            f"frame: {ms('paint')} (avg {ms('paint', 'avg_ms')})",
+            f"tiles drawn: {snapshot['gauges'].get('paint.last_tiles_drawn', 0)}"
+            f"  chunks: {snapshot['gauges'].get('paint.last_chunks_blitted', 0)}",
+            f"pixmap cache: {percent(derived['pixmap_cache.hit_rate'])}"
+            f"  chunk cache: {percent(derived['chunk_cache.hit_rate'])}",
+            f"save: {ms('save_map')}  load: {ms('load_map')}",
+            f"tileset split: {f'{split_rate:.0f} tiles/s' if split_rate else '-'}",
+        ]
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QBrush(QColor(0, 0, 0, 170)))
+        painter.drawRect(self._perf_overlay_rect)
+        painter.setPen(QColor(255, 255, 255))
+        painter.drawText(
+            self._perf_overlay_rect.adjusted(8, 6, -8, -6),
+            Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop,
+            "\n".join(lines),
+        )
+
+    def _draw_tile(self, painter, x, y, grid_pen):
+        ts = self.map_data.tile_size
+        tile_id = self.map_data.get_tile_id(x, y)
+        rect = QRect(x * ts, y * ts, ts, ts)
+
+        # タイルの描画
+        tile_def = self.map_data.get_tile_definition(tile_id)
+        if tile_def and tile_def.get("image"):
+            path = tile_def["image"]
+            key = (path, ts)
+            pix = self._pixmap_cache.get(key)
+            if pix is None:
+                if self._record_frame:
+                    metrics.count("pixmap_cache.miss")
+                original = QPixmap(path)
+                if not original.isNull():
+                    pix = original.scaled(ts, ts, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
                 else:
-                    color_value = tile_def["color"] if tile_def else "#000000"
-                    painter.setBrush(QBrush(QColor(color_value)))
-                    painter.setPen(grid_pen)
-                    painter.drawRect(rect)
+                    pix = QPixmap()
+                self._pixmap_cache[key] = pix
+            elif self._record_frame:
+                metrics.count("pixmap_cache.hit")
 
-                # グリッド線の描画
-                painter.setBrush(Qt.BrushStyle.NoBrush)
+            if not pix.isNull():
+                painter.drawPixmap(rect, pix)
+            else:
+                painter.setBrush(QBrush(QColor("#000000")))
                 painter.setPen(grid_pen)
                 painter.drawRect(rect)
+        else:
+            color_value = tile_def["color"] if tile_def else "#000000"
+            painter.setBrush(QBrush(QColor(color_value)))
+            painter.setPen(grid_pen)
+            painter.drawRect(rect)
+
+        # グリッド線の描画
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        painter.setPen(grid_pen)
+        painter.drawRect(rect)
+
+    def _draw_passability(self, painter, start_x, start_y, end_x, end_y):
+        """連結領域ごとに色分けし、通行不可のマスと経路を重ねて描画"""
+        ts = self.map_data.tile_size
+        passability = self.controller.passability
+        painter.setPen(Qt.PenStyle.NoPen)
+        blocked = QColor(0, 0, 0, 140)
+        for y in range(start_y, end_y):
+            for x in range(start_x, end_x):
+                label = passability.region_of(x, y)
+                if label:
+                    color = QColor.fromHsv((label * 47) % 360, 160, 230, 90)
+                else:
+                    color = blocked
+                painter.fillRect(QRect(x * ts, y * ts, ts, ts), color)
+
+        half = ts // 2
+        if self.path_cells:
+            painter.setPen(QPen(QColor(255, 255, 255), max(2, ts // 6)))
+            for (x0, y0), (x1, y1) in zip(self.path_cells, self.path_cells[1:]):
+                painter.drawLine(x0 * ts + half, y0 * ts + half, x1 * ts + half, y1 * ts + half)
+        painter.setPen(QPen(QColor(0, 0, 0), 2))
+        for cell, color in ((self.path_start, "#2ecc71"), (self.path_goal, "#e74c3c")):
+            if cell is not None:
+                painter.setBrush(QBrush(QColor(color)))
+                painter.drawEllipse(cell[0] * ts + ts // 4, cell[1] * ts + ts // 4, half, half)
 
     def mousePressEvent(self, event: QMouseEvent):
-        if event.button() == Qt.MouseButton.LeftButton:
-            self.dragging = True  # ドラッグ開始
-            self._update_tile(event)
+        if event.button() == Qt.MouseButton.RightButton and self.show_passability:
+            self._select_path_endpoint(event)
+        elif event.button() == Qt.MouseButton.LeftButton:
+            if self.tool == "select":
+                self._select_anchor = self._event_cell(event)
+                self._set_selection((*self._select_anchor, 1, 1))
+                self.dragging = True
+            elif self.tool == "stamp":
+                # スタンプは1回のクリックで1回だけ貼り付ける (1回分のUndo)
+                self.controller.apply_stamp(*self._event_cell(event))
+            else:
+                self.dragging = True  # ドラッグ開始
+                self.controller.begin_stroke()
+                self._update_tile(event)
 
     def mouseMoveEvent(self, event: QMouseEvent):
+        cell = self._event_cell(event)
+        if cell != self._hover_cell:
+            self._update_stamp_preview(self._hover_cell)
+            self._hover_cell = cell
+            self._update_stamp_preview(cell)
         if self.dragging:  # ドラッグ中のみ処理
-            self._update_tile(event)
+            if self.tool == "select":
+                self._extend_selection(cell)
+            else:
+                self._update_tile(event)
 
     def mouseReleaseEvent(self, event: QMouseEvent):
         if event.button() == Qt.MouseButton.LeftButton:
+            if self.dragging and self.tool == "paint":
+                self.controller.end_stroke()
             self.dragging = False  # ドラッグ終了
 
+    def _event_cell(self, event: QMouseEvent):
+        ts = self.map_data.tile_size
+        return int(event.position().x() // ts), int(event.position().y() // ts)
+
+    def _extend_selection(self, cell):
+        """ドラッグ開始セルと現在のセルを対角とする矩形を選択 (マップ内に制限)"""
+        ax, ay = self._select_anchor
+        x0 = max(0, min(ax, cell[0]))
+        y0 = max(0, min(ay, cell[1]))
+        x1 = min(self.map_data.width - 1, max(ax, cell[0]))
+        y1 = min(self.map_data.height - 1, max(ay, cell[1]))
+        if x1 >= x0 and y1 >= y0:
+            self._set_selection((x0, y0, x1 - x0 + 1, y1 - y0 + 1))
+
+    def _select_path_endpoint(self, event: QMouseEvent):
+        """右クリックで経路の始点→終点を交互に指定する"""
+        ts = self.map_data.tile_size
+        cell = (int(event.position().x() // ts), int(event.position().y() // ts))
+        if self.path_start is None or self.path_goal is not None:
+            self.path_start, self.path_goal = cell, None
+        else:
+            self.path_goal = cell
+        self._update_path()
+        self.update()
+
     def _update_tile(self, event: QMouseEvent):
         """マウスイベントからタイルを更新"""
         ts = self.map_data.tile_size
@@ -98,6 +489,5 @@ class MapWidget(QWidget):
         y = int(event.position().y() // ts)
 
         if 0 <= x < self.map_data.width and 0 <= y < self.map_data.height:
-            self.map_data.set_tile_id(x, y, self.map_data.current_tile_id)
-            # 変更されたタイルのみ再描画
-            self.update(QRect(x * ts, y * ts, ts, ts))
+            # 再描画は変更通知 (_on_map_changed) 経由で変更セルのみ行われる
+            self.controller.place_tile(x, y)
@@ -0,0 +1,207 @@
+import threading
+from collections import OrderedDict
+
+from PyQt6.QtCore import QObject, QRect, QRunnable, QThreadPool, Qt, pyqtSignal
+from PyQt6.QtGui import QBrush, QColor, QImage, QPainter, QPen
+
+# 先読みの単位 (タイル数)。1チャンク = CHUNK_TILES x CHUNK_TILES タイル
+CHUNK_TILES = 16
+# 保持するチャンク画像の上限 (古いものから破棄)
+MAX_CACHED_CHUNKS = 48
+# 同時にスレッドプールへ投入するチャンク数の上限 (高速スクロール時に古い依頼が溜まらないようにする)
+# 無効化された後も実行中のタスクは終わるまでこの数に含める
+MAX_PENDING_CHUNKS = 16
+
+
+class _ImageStore:
+    """ワーカースレッド間で共有する、縮小済みタイル画像 (QImage) のキャッシュ"""
+
+    def __init__(self):
+        self._images: dict[tuple[str, int], QImage] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, ts):
+        key = (path, ts)
+        with self._lock:
+            image = self._images.get(key)
+        if image is None:
+            # QPixmap と違い QImage はGUIスレッド以外でも読み込める
+            image = QImage(path)
+            if not image.isNull():
+                image = image.scaled(
+                    ts, ts,
+                    Qt.AspectRatioMode.IgnoreAspectRatio,
+                    Qt.TransformationMode.SmoothTransformation,
+                )
+            with self._lock:
+                self._images[key] = image
+        return image
+
+    def discard(self, paths):
+        with self._lock:
+            for key in [key for key in self._images if key[0] in paths]:
+                del self._images[key]
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+
+
+class _ChunkSignals(QObject):
+    finished = pyqtSignal(object, object, QImage)
+
+
+class _ChunkRenderTask(QRunnable):
+    """1チャンク分のタイルをオフスクリーンの QImage に描画する"""
+
+    def __init__(self, key, version, rows, tiles, ts, images, signals):
+        super().__init__()
+        self.key = key
+        self.version = version
+        self.rows = rows  # GUIスレッドで取ったタイルIDのコピー
+        self.tiles = tiles  # tile_id -> (color, image path)
+        self.ts = ts
+        self.images = images
+        self.signals = signals
+
+    def run(self):
+        ts = self.ts
+        width = max((len(row) for row in self.rows), default=0)
+        image = QImage(width * ts, len(self.rows) * ts, QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(QColor("#000000"))
+        painter = QPainter(image)
+        grid_pen = QPen(QColor(100, 100, 100), 1)
+        for y, row in enumerate(self.rows):
+            for x, tile_id in enumerate(row):
+                rect = QRect(x * ts, y * ts, ts, ts)
+                color, path = self.tiles.get(tile_id, ("#000000", None))
+                tile_image = self.images.get(path, ts) if path else None
+                if tile_image is not None and not tile_image.isNull():
+                    painter.drawImage(rect, tile_image)
+                else:
+                    painter.setBrush(QBrush(QColor(color if not path else "#000000")))
+                    painter.setPen(grid_pen)
+                    painter.drawRect(rect)
+                painter.setBrush(Qt.BrushStyle.NoBrush)
+                painter.setPen(grid_pen)
+                painter.drawRect(rect)
+        painter.end()
+        self.signals.finished.emit(self.key, self.version, image)
+
+
+class ChunkPrefetcher(QObject):
+    """
+    ビューポート外のチャンクをバックグラウンドで描画しておき、
+    paintEvent から完成済みの画像を受け取れるようにする
+    """
+
+    chunk_ready = pyqtSignal(object)  # (cx, cy)
+
+    def __init__(self, map_data, parent=None):
+        super().__init__(parent)
+        self.map_data = map_data
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(2)
+        self._images = _ImageStore()
+        self._ready: OrderedDict[tuple[int, int], QImage] = OrderedDict()
+        self._versions: dict[tuple[int, int], int] = {}
+        # 描画結果を待っているチャンク -> 依頼したときのバージョン
+        self._pending: dict[tuple[int, int], tuple[int, int]] = {}
+        # 投入済みで完了通知をまだ受け取っていないタスク ((key, version) -> task)
+        self._in_flight: dict[tuple, _ChunkRenderTask] = {}
+        self._generation = 0  # clear() ごとに増やし、古い描画結果を捨てる
+        self._signals = _ChunkSignals()
+        # シグナルはワーカースレッドから発行され、GUIスレッドで受け取る
+        self._signals.finished.connect(self._on_finished)
+
+    def take(self, key):
+        """描画済みのチャンク画像を返す。無ければ None"""
+        image = self._ready.get(key)
+        if image is not None:
+            self._ready.move_to_end(key)
+        return image
+
+    def request(self, keys):
+        """未描画のチャンクの描画を依頼する (keys は優先度順)"""
+        for key in keys:
+            if len(self._in_flight) >= MAX_PENDING_CHUNKS:
+                break
+            if key in self._ready or key in self._pending:
+                continue
+            task = self._make_task(key)
+            if task is None:
+                continue
+            self._pending[key] = task.version
+            self._in_flight[(key, task.version)] = task
+            self._pool.start(task)
+
+    def invalidate(self, x, y, w, h):
+        """タイル座標の範囲に掛かるチャンクを無効化する"""
+        for cy in range(y // CHUNK_TILES, (y + h - 1) // CHUNK_TILES + 1):
+            for cx in range(x // CHUNK_TILES, (x + w - 1) // CHUNK_TILES + 1):
+                key = (cx, cy)
+                self._versions[key] = self._versions.get(key, 0) + 1
+                self._ready.pop(key, None)
+                version = self._pending.pop(key, None)
+                if version is not None:
+                    self._take_back((key, version))
+
+    def clear(self, images=False):
+        """全チャンクを無効化する。images=True ならタイル画像のキャッシュも破棄"""
+        self._generation += 1
+        self._versions.clear()
+        self._ready.clear()
+        self._pending.clear()
+        # まだ始まっていない描画を取り下げる (QThreadPool.clear() と同じだが、
+        # どのタスクが取り下げられたかが分かるので実行中のタスクだけを数え続けられる)
+        for task_key in list(self._in_flight):
+            self._take_back(task_key)
+        if images:
+            self._images.clear()
+
+    def discard_images(self, paths):
+        """指定した画像の読み込み済みデータを破棄する (該当チャンクの無効化は呼び出し側で行う)"""
+        self._images.discard(set(paths))
+
+    def _take_back(self, task_key):
+        """開始前のタスクをスレッドプールから取り除く。実行中なら完了通知を待つ"""
+        if self._pool.tryTake(self._in_flight[task_key]):
+            del self._in_flight[task_key]
+
+    def shutdown(self):
+        self._pool.clear()
+        self._pool.waitForDone()
+
+    def _make_task(self, key):
+        cx, cy = key
+        map_data = self.map_data
+        x0, y0 = cx * CHUNK_TILES, cy * CHUNK_TILES
+        if x0 >= map_data.width or y0 >= map_data.height or cx < 0 or cy < 0:
+            return None
+        x1 = min(x0 + CHUNK_TILES, map_data.width)
+        y1 = min(y0 + CHUNK_TILES, map_data.height)
+        rows = [map_data.data[y][x0:x1] for y in range(y0, y1)]
+        tiles = {}
+        for row in rows:
+            for tile_id in row:
+                if tile_id not in tiles:
+                    tile_def = map_data.get_tile_definition(tile_id)
+                    tiles[tile_id] = (
+                        (tile_def["color"], tile_def.get("image"))
+                        if tile_def
+                        else ("#000000", None)
+                    )
+        version = (self._generation, self._versions.get(key, 0))
+        return _ChunkRenderTask(
+            key, version, rows, tiles, map_data.tile_size, self._images, self._signals
+        )
+
+    def _on_finished(self, key, version, image):
+        self._in_flight.pop((key, version), None)
+        if self._pending.get(key) != version:
+            return  # 描画中に無効化された
+        del self._pending[key]
+        self._ready[key] = image
+        while len(self._ready) > MAX_CACHED_CHUNKS:
+            self._ready.popitem(last=False)
+        self.chunk_ready.emit(key)
@@ -0,0 +1,76 @@
+import os
+
+from PyQt6.QtCore import QFileSystemWatcher, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from PyQt6.QtGui import QImage
+
+# 保存中の連続した変更通知をまとめる待ち時間 (ms)
+DEBOUNCE_MS = 200
+
+
+class _DecodeSignals(QObject):
+    decoded = pyqtSignal(object)  # {path: QImage}
+
+
+class _DecodeTask(QRunnable):
+    """変更された画像をワーカースレッドで読み直す"""
+
+    def __init__(self, paths, signals):
+        super().__init__()
+        self.paths = paths
+        self.signals = signals
+
+    def run(self):
+        # 読み込めなかった画像も空の QImage として渡し、黒タイル表示に戻す
+        self.signals.decoded.emit({path: QImage(path) for path in self.paths})
+
+
+class TileImageWatcher(QObject):
+    """
+    tile_sets が参照する画像ファイルを監視し、変更された画像だけを読み直して通知する
+    """
+
+    images_reloaded = pyqtSignal(object)  # {path: QImage}
+
+    def __init__(self, map_data, parent=None, debounce_ms=DEBOUNCE_MS):
+        super().__init__(parent)
+        self.map_data = map_data
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._on_file_changed)
+        self._changed: set[str] = set()
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(debounce_ms)
+        self._debounce.timeout.connect(self._reload_changed)
+        self._signals = _DecodeSignals()
+        self._signals.decoded.connect(self.images_reloaded)
+
+    def image_paths(self):
+        return {
+            tile["image"]
+            for tiles in self.map_data.tile_sets.values()
+            for tile in tiles
+            if tile.get("image")
+        }
+
+    def sync_paths(self):
+        """監視対象を現在の tile_sets に合わせる (タイルセット変更後に呼ぶ)"""
+        wanted = {path for path in self.image_paths() if os.path.exists(path)}
+        watched = set(self._watcher.files())
+        if watched - wanted:
+            self._watcher.removePaths(list(watched - wanted))
+        if wanted - watched:
+            self._watcher.addPaths(list(wanted - watched))
+
+    def _on_file_changed(self, path):
+        # 別名保存→置き換えで保存するエディタでは監視が外れるので付け直す
+        if path not in self._watcher.files() and os.path.exists(path):
+            self._watcher.addPath(path)
+        self._changed.add(path)
+        self._debounce.start()
+
+    def _reload_changed(self):
+        paths, self._changed = self._changed, set()
+        # 置き換え途中で一時的に消えていたファイルを監視に戻す
+        self.sync_paths()
+        if paths:
+            QThreadPool.globalInstance().start(_DecodeTask(sorted(paths), self._signals))